@@ -0,0 +1,292 @@
+import multiprocessing
+import platform
+import resource
+import statistics
+import sys
+import time
+import traceback
+
+import numpy as np
+import scipy
+from pyformlang.cfg import CFG
+
+from project import cfpq
+from project.finite_state_machine_manager import ap_rpq, ms_rpq
+from project.graph_generators import (
+    chain_graph,
+    grid_graph,
+    random_graph,
+    scale_free_graph,
+    two_cycles_graph,
+)
+from project.graph_manager import get_graph_index_by_name
+
+# a case is a regression if its time or peak memory exceeds the baseline this many times
+TIME_THRESHOLD = 1.25
+MEMORY_THRESHOLD = 1.25
+# seconds of the time difference that are always treated as noise
+TIME_TOLERANCE = 0.05
+
+# generators of synthetic graphs over the labels "a" and "b" by the names used
+# in graph specifications "name:arg:arg", the arguments are integers
+GENERATORS = {
+    "two_cycles": lambda n, m: two_cycles_graph(n, m, ("a", "b")),
+    "chain": lambda n: chain_graph(n, ("a", "b")),
+    "grid": lambda rows, columns: grid_graph(rows, columns, ("a", "b")),
+    "random": lambda n, m, seed=0: random_graph(n, m, ("a", "b"), seed),
+    "scale_free": lambda n, m, seed=0: scale_free_graph(n, m, ("a", "b"), seed=seed),
+}
+
+# grammar and regular expression (None for non-regular queries) of the standard queries
+# over the labels {a} and {b}, which are the two most used labels of the graph
+QUERIES = {
+    "dyck": ("S -> {a} S {b} S | epsilon", None),
+    "same_generation": ("S -> {a} S {b} | {a} {b}", None),
+    "regular": ("S -> {a} S | {b}", "{a}* {b}"),
+}
+
+# engines by their names and whether they answer context-free queries
+ENGINES = {
+    "hellings": True,
+    "matrix": True,
+    "tensor": True,
+    "ap_rpq": False,
+    "ms_rpq": False,
+}
+
+# synthetic graphs of sizes the slowest engines answer within seconds and small datasets
+DEFAULT_GRAPHS = [
+    "two_cycles:50:40",
+    "chain:300",
+    "grid:20:20",
+    "random:300:1200:0",
+    "scale_free:300:1200:0",
+    "skos",
+    "generations",
+    "travel",
+]
+
+
+def get_benchmark_graph(spec):
+    """
+        Builds the index of the graph by its specification:
+        "name:arg:arg" for a synthetic graph of GENERATORS with integer arguments,
+        otherwise the name of a cfpq_data dataset
+
+    :param spec: specification of the graph
+    :return: GraphIndex
+    """
+    name, *args = spec.split(":")
+    if name in GENERATORS:
+        return GENERATORS[name](*map(int, args)).to_index()
+    return get_graph_index_by_name(spec)
+
+
+def get_query(index, query):
+    """
+        Grammar and regular expression of the standard query over the graph
+
+    :param index: index of the graph
+    :param query: name of the query in QUERIES
+    :return: CFG and regular expression or None
+    """
+    labels = sorted(index.label_statistics, key=lambda x: -index.label_statistics[x])
+    a, b = (labels + labels)[:2] if labels else ("a", "b")
+    cfg, regex = QUERIES[query]
+    cfg = CFG.from_text(cfg.format(a=a, b=b))
+    return cfg, None if regex is None else regex.format(a=a, b=b)
+
+
+def run_engine(engine, index, cfg, regex):
+    """
+        Answers the query by the engine
+
+    :return: answer as a collection of pairs of vertices
+    """
+    if engine == "hellings":
+        return cfpq.hellings(index, cfg)
+    if engine == "matrix":
+        return cfpq.matrix(index, cfg)
+    if engine == "tensor":
+        return cfpq.tensor(index, cfg)
+    if engine == "ap_rpq":
+        return ap_rpq(index, regex)
+    if engine == "ms_rpq":
+        return ms_rpq(index, regex)
+    raise ValueError(f"Unknown engine: {engine}")
+
+
+def get_peak_rss():
+    """
+    Peak resident set size of the process in bytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run_case(connection, graph, query, engine, repeats):
+    try:
+        index = get_benchmark_graph(graph)
+        cfg, regex = get_query(index, query)
+        load_rss = get_peak_rss()
+        times = []
+        for _ in range(repeats):
+            begin = time.perf_counter()
+            answer = run_engine(engine, index, cfg, regex)
+            times.append(time.perf_counter() - begin)
+        connection.send(
+            {
+                "status": "ok",
+                "time": min(times),
+                "median_time": statistics.median(times),
+                "peak_rss": get_peak_rss(),
+                "load_rss": load_rss,
+                "answer_size": len(answer),
+                "number_of_nodes": index.number_of_nodes,
+                "number_of_edges": index.number_of_edges,
+            }
+        )
+    except Exception:
+        connection.send({"status": "error", "error": traceback.format_exc()})
+
+
+def run_case(graph, query, engine, repeats=3, timeout=None):
+    """
+        Measures one engine on one query over one graph in a separate process,
+        so that the peak memory of the case is not affected by the other cases
+
+    :param graph: specification of the graph, see get_benchmark_graph
+    :param query: name of the query in QUERIES
+    :param engine: name of the engine in ENGINES
+    :param repeats: number of runs, the minimum and the median time are recorded
+    :param timeout: seconds after which the case is stopped, no limit if None
+    :return: dictionary of the measurements
+    """
+    result = {"graph": graph, "query": query, "engine": engine}
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=_run_case, args=(sender, graph, query, engine, repeats)
+    )
+    process.start()
+    sender.close()
+    if receiver.poll(timeout):
+        try:
+            result.update(receiver.recv())
+        except EOFError:
+            result.update(status="error", error="The process has died")
+    else:
+        process.terminate()
+        result.update(status="timeout")
+    process.join()
+    return result
+
+
+def get_cases(graphs, queries, engines):
+    """
+    Triples of a graph, a query and an engine able to answer the query
+    """
+    return [
+        (graph, query, engine)
+        for graph in graphs
+        for query in queries
+        for engine in engines
+        if ENGINES[engine] or QUERIES[query][1] is not None
+    ]
+
+
+def get_environment():
+    """
+    Versions and hardware the results are measured on
+    """
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+    }
+
+
+def run_benchmarks(
+    graphs=DEFAULT_GRAPHS,
+    queries=tuple(QUERIES),
+    engines=tuple(ENGINES),
+    repeats=3,
+    timeout=None,
+    on_result=None,
+):
+    """
+        Runs every engine on every query it answers over every graph
+
+    :param graphs: specifications of the graphs, see get_benchmark_graph
+    :param queries: names of the queries in QUERIES
+    :param engines: names of the engines in ENGINES
+    :param repeats: number of runs of every case
+    :param timeout: seconds after which a case is stopped
+    :param on_result: function called with the result of every case as soon as it is measured
+    :return: dictionary of the environment and the list of results of the cases
+    """
+    results = []
+    for graph, query, engine in get_cases(graphs, queries, engines):
+        result = run_case(graph, query, engine, repeats, timeout)
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+    return {"environment": get_environment(), "results": results}
+
+
+def compare_with_baseline(
+    report,
+    baseline,
+    time_threshold=TIME_THRESHOLD,
+    memory_threshold=MEMORY_THRESHOLD,
+    time_tolerance=TIME_TOLERANCE,
+):
+    """
+        Finds the cases that became slower, use more memory, fail
+        or give answers of another size than in the baseline,
+        the cases missing in the baseline are not compared
+
+    :param report: results of run_benchmarks
+    :param baseline: results of run_benchmarks stored earlier
+    :param time_threshold: allowed ratio of the time to the baseline time
+    :param memory_threshold: allowed ratio of the peak memory to the baseline one
+    :param time_tolerance: seconds of the difference that are not a regression in any case
+    :return: list of the regressions as dictionaries of the case, the metric and both values
+    """
+    expected = {
+        (result["graph"], result["query"], result["engine"]): result
+        for result in baseline["results"]
+    }
+    regressions = []
+    for result in report["results"]:
+        case = (result["graph"], result["query"], result["engine"])
+        if case not in expected or expected[case]["status"] != "ok":
+            continue
+        old = expected[case]
+        changes = []
+        if result["status"] != "ok":
+            changes.append(("status", old["status"], result["status"]))
+        else:
+            if result["answer_size"] != old["answer_size"]:
+                changes.append(
+                    ("answer_size", old["answer_size"], result["answer_size"])
+                )
+            if result["time"] > old["time"] * time_threshold + time_tolerance:
+                changes.append(("time", old["time"], result["time"]))
+            if result["peak_rss"] > old["peak_rss"] * memory_threshold:
+                changes.append(("peak_rss", old["peak_rss"], result["peak_rss"]))
+        regressions.extend(
+            {
+                "graph": case[0],
+                "query": case[1],
+                "engine": case[2],
+                "metric": metric,
+                "baseline": old_value,
+                "value": value,
+            }
+            for metric, old_value, value in changes
+        )
+    return regressions
@@ -0,0 +1,226 @@
+import numpy as np
+from scipy import sparse
+
+# inputs sparser than this are kept in csr by the "auto" backend
+DENSE_MIN_DENSITY = 0.01
+# the "auto" backend keeps dense float32 matrices up to this size in bytes, bitsets above it
+DENSE_MAX_BYTES = 64 * 2**20
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+class SparseBackend:
+    """
+    Boolean matrices as scipy csr matrices
+    """
+
+    name = "sparse"
+
+    def from_sparse(self, matrix):
+        return sparse.csr_matrix(matrix, dtype=bool)
+
+    def to_sparse(self, matrix):
+        return matrix
+
+    def zeros(self, shape):
+        return sparse.csr_matrix(shape, dtype=bool)
+
+    def identity(self, n):
+        return sparse.identity(n, dtype=bool, format="csr")
+
+    def multiply(self, a, b):
+        # scipy allocates a mask of all the columns for every product,
+        # so a product of a few rows is built from the gathered rows of b
+        stored = a.data != 0
+        inner = a.indices[stored]
+        counts = b.indptr[inner + 1] - b.indptr[inner]
+        if counts.sum() >= b.shape[1]:
+            return a @ b
+        rows = np.repeat(np.arange(a.shape[0]), np.diff(a.indptr))[stored]
+        offsets = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        positions = np.repeat(b.indptr[inner], counts) + offsets
+        gathered = b.data[positions] != 0
+        result = sparse.csr_matrix(
+            (
+                np.ones(gathered.sum(), dtype=bool),
+                (np.repeat(rows, counts)[gathered], b.indices[positions[gathered]]),
+            ),
+            shape=(a.shape[0], b.shape[1]),
+        )
+        result.sum_duplicates()
+        return result
+
+    def add(self, a, b):
+        return a + b
+
+    def difference(self, a, b):
+        return a > b
+
+    def kron(self, a, b):
+        return sparse.kron(a, b, format="csr")
+
+    def select_rows(self, matrix, mask):
+        return sparse.diags(mask, dtype=bool, format="csr") @ matrix
+
+    def nnz(self, matrix):
+        return matrix.nnz
+
+    def nonzero(self, matrix):
+        return matrix.nonzero()
+
+
+class DenseBackend:
+    """
+    Boolean matrices as dense numpy arrays, products are computed by BLAS over float32
+    """
+
+    name = "dense"
+
+    def from_sparse(self, matrix):
+        return sparse.csr_matrix(matrix, dtype=bool).toarray()
+
+    def to_sparse(self, matrix):
+        return sparse.csr_matrix(matrix, dtype=bool)
+
+    def zeros(self, shape):
+        return np.zeros(shape, dtype=bool)
+
+    def identity(self, n):
+        return np.eye(n, dtype=bool)
+
+    def multiply(self, a, b):
+        # the sums are exact in float32 while the inner dimension is below 2 ** 24
+        return (a.astype(np.float32) @ b.astype(np.float32)) > 0
+
+    def add(self, a, b):
+        return a | b
+
+    def difference(self, a, b):
+        return a & ~b
+
+    def kron(self, a, b):
+        return np.kron(a, b)
+
+    def select_rows(self, matrix, mask):
+        return matrix & np.asarray(mask, dtype=bool)[:, None]
+
+    def nnz(self, matrix):
+        return int(np.count_nonzero(matrix))
+
+    def nonzero(self, matrix):
+        return matrix.nonzero()
+
+
+class BitsetMatrix:
+    """
+    Boolean matrix with every row packed into uint64 words, bit j of the row is column j
+    """
+
+    def __init__(self, words, shape):
+        self.words = words
+        self.shape = shape
+
+
+class BitsetBackend:
+    """
+    Boolean matrices as rows of packed uint64 bitsets: a product ORs the rows of the right matrix,
+    so 64 columns are processed by one machine operation
+    """
+
+    name = "bitset"
+
+    def zeros(self, shape):
+        return BitsetMatrix(
+            np.zeros((shape[0], (shape[1] + 63) // 64), np.uint64), shape
+        )
+
+    def from_sparse(self, matrix):
+        matrix = sparse.coo_matrix(matrix, dtype=bool)
+        result = self.zeros(matrix.shape)
+        rows, cols = matrix.row, matrix.col.astype(np.uint64)
+        np.bitwise_or.at(
+            result.words,
+            (rows, cols >> np.uint64(6)),
+            np.uint64(1) << (cols & np.uint64(63)),
+        )
+        return result
+
+    def to_sparse(self, matrix):
+        rows, cols = self.nonzero(matrix)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, cols)), shape=matrix.shape
+        )
+
+    def identity(self, n):
+        return self.from_sparse(sparse.identity(n, dtype=bool))
+
+    def multiply(self, a, b):
+        result = self.zeros((a.shape[0], b.shape[1]))
+        for k in np.flatnonzero(b.words.any(axis=1)):
+            rows = np.flatnonzero(
+                (a.words[:, k >> 6] >> np.uint64(k & 63)) & np.uint64(1)
+            )
+            result.words[rows] |= b.words[k]
+        return result
+
+    def add(self, a, b):
+        return BitsetMatrix(a.words | b.words, a.shape)
+
+    def difference(self, a, b):
+        return BitsetMatrix(a.words & ~b.words, a.shape)
+
+    def kron(self, a, b):
+        return self.from_sparse(
+            sparse.kron(self.to_sparse(a), self.to_sparse(b), format="coo")
+        )
+
+    def select_rows(self, matrix, mask):
+        words = matrix.words * np.asarray(mask, dtype=np.uint64)[:, None]
+        return BitsetMatrix(words, matrix.shape)
+
+    def nnz(self, matrix):
+        return int(
+            _POPCOUNT[matrix.words.astype("<u8", copy=False).view(np.uint8)].sum()
+        )
+
+    def nonzero(self, matrix):
+        bits = np.unpackbits(
+            matrix.words.astype("<u8", copy=False).view(np.uint8),
+            axis=1,
+            bitorder="little",
+        ).reshape(matrix.shape[0], 64 * matrix.words.shape[1])
+        rows, cols = bits[:, : matrix.shape[1]].nonzero()
+        return rows, cols
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (SparseBackend(), DenseBackend(), BitsetBackend())
+}
+
+
+def get_backend(backend="auto", matrices=()):
+    """
+        Returns the backend of boolean matrix operations
+
+    :param backend: name of the backend ("sparse", "dense", "bitset"), backend object
+        or "auto" to choose by the density of the matrices:
+        sparse inputs stay in csr, dense ones are kept as dense arrays
+        while they fit DENSE_MAX_BYTES and as bitsets otherwise
+    :param matrices: scipy matrices the operations start from
+    :return: backend object
+    """
+    if backend is None or backend == "auto":
+        size = sum(m.shape[0] * m.shape[1] for m in matrices)
+        nnz = sum(m.nnz for m in matrices)
+        if size == 0 or nnz < DENSE_MIN_DENSITY * size:
+            return BACKENDS["sparse"]
+        largest = max(m.shape[0] * m.shape[1] for m in matrices)
+        return BACKENDS["dense" if 4 * largest <= DENSE_MAX_BYTES else "bitset"]
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown boolean matrix backend: {backend}")
+        return BACKENDS[backend]
+    return backend
@@ -0,0 +1,81 @@
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    """
+    In-process cache with least recently used eviction
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value and marks it as the most recently used
+        """
+        with self.lock:
+            if key not in self.items:
+                return default
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value):
+        """
+        Stores the value, evicting the least recently used one if the cache is full
+        """
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+
+def load_from_disk(cache_dir, key):
+    """
+        Loads a value stored by store_on_disk
+
+    :param cache_dir: directory of the on-disk cache
+    :param key: string key of the value
+    :return: stored value or None if there is no readable entry for the key
+    """
+    path = os.path.join(cache_dir, key + ".pickle")
+    try:
+        with open(path, "rb") as file:
+            return pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def store_on_disk(cache_dir, key, value):
+    """
+        Atomically stores the value in the on-disk cache
+
+    :param cache_dir: directory of the on-disk cache, created if missing
+    :param key: string key of the value
+    :param value: picklable value
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, os.path.join(cache_dir, key + ".pickle"))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
@@ -2,11 +2,32 @@ from project.context_free_grammar import (
     context_free_path_querying_by_hellinges,
     context_free_path_querying_by_matrix,
 )
+from project.tensor import context_free_path_querying_by_tensor
 
 
 def hellings(graph, cfg):
     return context_free_path_querying_by_hellinges(graph, cfg)
 
 
-def matrix(graph, cfg):
-    return context_free_path_querying_by_matrix(graph, cfg)
+def matrix(
+    graph,
+    cfg,
+    semi_naive=True,
+    start_vertex=None,
+    end_vertex=None,
+    backend="auto",
+    stats=None,
+):
+    return context_free_path_querying_by_matrix(
+        graph,
+        cfg,
+        start_vertex,
+        end_vertex,
+        semi_naive=semi_naive,
+        backend=backend,
+        stats=stats,
+    )
+
+
+def tensor(graph, cfg, backend="auto"):
+    return context_free_path_querying_by_tensor(graph, cfg, backend=backend)
@@ -1,9 +1,18 @@
-from networkx import MultiDiGraph
+import hashlib
+import time
+
+import numpy as np
 from pyformlang.cfg import CFG, Variable, Terminal
-from scipy.sparse import dok_matrix
-from networkx.drawing import nx_pydot
+from scipy.sparse import csr_matrix, diags
 
+from project.boolean_backend import get_backend
+from project.cache import LRUCache, load_from_disk, store_on_disk
+from project.graph_index import GraphIndex, get_graph_index
+from project.graph_io import load_graph_index
 from project.matrix_manager import transitive_closure
+from project.stats import multiply
+
+GRAMMAR_CACHE = LRUCache(maxsize=64)
 
 
 def cfg_into_weak_cnf(cfg, start_symbol=Variable("S")) -> CFG:
@@ -46,60 +55,175 @@ def get_cfg_from_file(file_name: str, start_symbol=Variable("S")) -> CFG:
     return get_cfg_from_text(text, start_symbol)
 
 
-def hellinges(graph: MultiDiGraph, cfg: CFG):
+class CompiledGrammar:
+    """
+    Context-free grammar in weak Chomsky's normal form
+    with the production tables used by the CFPQ algorithms
+    """
+
+    def __init__(self, cfg: CFG):
+        self.cfg = cfg_into_weak_cnf(cfg)
+        self.start_symbol = self.cfg.start_symbol
+        self.variables = list(self.cfg.variables)
+        # heads of A -> epsilon
+        self.eps_heads = set()
+        # terminal value of A -> a to the set of heads
+        self.terminal_heads = {}
+        # (B, C) of A -> B C to the set of heads
+        self.binary_heads = {}
+        for production in self.cfg.productions:
+            if not production.body:
+                self.eps_heads.add(production.head)
+            elif len(production.body) == 1:
+                self.terminal_heads.setdefault(production.body[0].value, set()).add(
+                    production.head
+                )
+            else:
+                self.binary_heads.setdefault(tuple(production.body), set()).add(
+                    production.head
+                )
+
+    @property
+    def binary_productions(self):
+        """
+        Productions A -> B C as (A, B, C) triples
+        """
+        return [
+            (head, left, right)
+            for (left, right), heads in self.binary_heads.items()
+            for head in heads
+        ]
+
+
+def get_grammar_fingerprint(cfg: CFG) -> str:
+    """
+        Canonical fingerprint of a grammar that does not depend
+        on the order of productions
+
+    :param cfg: context-free grammar as object
+    :return: hex digest of the start symbol and the sorted productions
+    """
+    productions = sorted(
+        (
+            production.head.value,
+            tuple(
+                (isinstance(symbol, Terminal), symbol.value)
+                for symbol in production.body
+            ),
+        )
+        for production in cfg.productions
+    )
+    start = cfg.start_symbol.value if cfg.start_symbol is not None else None
+    return hashlib.sha256(repr((start, productions)).encode("utf-8")).hexdigest()
+
+
+def compile_grammar(cfg, start_symbol=Variable("S"), cache_dir=None) -> CompiledGrammar:
+    """
+        Converts grammar into weak Chomsky's normal form and builds production tables,
+        reusing the result for grammars with the same fingerprint
+
+    :param cfg: context-free grammar as object, as a string or already compiled
+    :param start_symbol: start symbol, S by default, for cfg as a string
+    :param cache_dir: directory of the on-disk cache, it is not used if None
+    :return: compiled grammar
+    """
+    if isinstance(cfg, CompiledGrammar):
+        return cfg
+    if isinstance(cfg, str):
+        cfg = get_cfg_from_text(cfg, start_symbol)
+    fingerprint = get_grammar_fingerprint(cfg)
+    compiled = GRAMMAR_CACHE.get(fingerprint)
+    if compiled is None and cache_dir is not None:
+        compiled = load_from_disk(cache_dir, fingerprint)
+    if compiled is None:
+        compiled = CompiledGrammar(cfg)
+        if cache_dir is not None:
+            store_on_disk(cache_dir, fingerprint, compiled)
+    GRAMMAR_CACHE.put(fingerprint, compiled)
+    return compiled
+
+
+def hellinges(graph, cfg: CFG):
     """
         Finds paths in the graph between vertices according
         to the conditions of grammar with the help
         of the Hellings algorithm
-    :param graph: the graph representation of the automaton
-    :param cfg: context-free grammar as object
+    :param graph: the graph representation of the automaton (MultiDiGraph or GraphIndex)
+    :param cfg: context-free grammar as object or compiled grammar
     :return: a set of triples of a species (non-terminus, vertex, vertex).
     """
-    cfg = cfg_into_weak_cnf(cfg)
-    r = {
-        (nt, v, v)
-        for v in graph.nodes
-        for nt in {i.head.value for i in cfg.productions if not i.body}
-    } | {
-        (nt.head.value, v, u)
-        for (v, u, t) in graph.edges(data="label")
-        for nt in {i for i in cfg.productions if len(i.body) == 1}
-        if nt.body[0].value == t
+    grammar = compile_grammar(cfg)
+    # nonterminals and vertices are interned into integer ids
+    variables = {var: i for (i, var) in enumerate(grammar.variables)}
+    names = [var.value for var in grammar.variables]
+    index = get_graph_index(graph)
+    nodes = index.nodes
+
+    eps_heads = {variables[head] for head in grammar.eps_heads}
+    terminal_heads = {
+        t: {variables[head] for head in heads}
+        for t, heads in grammar.terminal_heads.items()
     }
-    m = r.copy()
-    nt = {i for i in cfg.productions if len(i.body) == 2}
-    while m:
-        nti, v, u = m.pop()
-        for (ntj, vs, _) in {i for i in r if i[2] == v}:
-            for trio in {
-                (i.head.value, vs, u)
-                for i in nt
-                if (i.head.value, vs, u) not in r
-                and i.body[0].value == ntj
-                and i.body[1].value == nti
-            }:
-                m |= {trio}
-                r |= {trio}
-        for (ntj, _, us) in {i for i in r if i[1] == u}:
-            for trio in {
-                (i.head.value, v, us)
-                for i in nt
-                if (i.head.value, v, us) not in r
-                and i.body[0].value == nti
-                and i.body[1].value == ntj
-            }:
-                m |= {trio}
-                r |= {trio}
-    return r
+    # for the production A -> B C: by_left[B] holds (A, C), by_right[C] holds (A, B)
+    by_left = {}
+    by_right = {}
+    for head, left, right in grammar.binary_productions:
+        head, left, right = variables[head], variables[left], variables[right]
+        by_left.setdefault(left, []).append((head, right))
+        by_right.setdefault(right, []).append((head, left))
+
+    # by_start[v][A] is a set of u, by_end[u][A] is a set of v for derived (A, v, u)
+    by_start = [{} for _ in nodes]
+    by_end = [{} for _ in nodes]
+    worklist = []
+
+    def add(nt, v, u):
+        ends = by_start[v].setdefault(nt, set())
+        if u not in ends:
+            ends.add(u)
+            by_end[u].setdefault(nt, set()).add(v)
+            worklist.append((nt, v, u))
+
+    for v in range(len(nodes)):
+        for nt in eps_heads:
+            add(nt, v, v)
+    for t, heads in terminal_heads.items():
+        if t not in index.matrices:
+            continue
+        for v, u in zip(*index.matrices[t].nonzero()):
+            for nt in heads:
+                add(nt, int(v), int(u))
 
+    while worklist:
+        nt, v, u = worklist.pop()
+        # (B, vs, v) and (nt, v, u) give (A, vs, u) for A -> B nt
+        for head, left in by_right.get(nt, ()):
+            for vs in list(by_end[v].get(left, ())):
+                add(head, vs, u)
+        # (nt, v, u) and (C, u, us) give (A, v, us) for A -> nt C
+        for head, right in by_left.get(nt, ()):
+            for us in list(by_start[u].get(right, ())):
+                add(head, v, us)
 
-def matrix(graph, cfg):
+    return {
+        (names[nt], nodes[v], nodes[u])
+        for v in range(len(nodes))
+        for nt, ends in by_start[v].items()
+        for u in ends
+    }
+
+
+def matrix(graph, cfg, semi_naive=True, backend="auto", stats=None):
     """
         Finds paths in the graph between vertices according
         to the conditions of grammar with the help
         of the Matrix algorithm
-    :param graph: the graph representation of the automaton (can be path_to_file or MultiGraph object)
-    :param cfg: context-free grammar as object (can be string, path_to_file or CFG object)
+    :param graph: the graph representation of the automaton (can be path_to_file, MultiGraph or GraphIndex object)
+    :param cfg: context-free grammar as object (can be string, path_to_file, CFG or CompiledGrammar object)
+    :param semi_naive: multiply only the entries added on the previous round (true)
+        or recompute every production in full on each round (false)
+    :param backend: backend of boolean matrix operations, see get_backend
+    :param stats: EngineStats receiving the rounds and products of the fixpoint, nothing is measured if None
     :return: a set of triples of a species (non-terminus, vertex, vertex).
     """
     if isinstance(cfg, str):
@@ -107,45 +231,333 @@ def matrix(graph, cfg):
             cfg = get_cfg_from_file(cfg)
         except OSError:
             cfg = get_cfg_from_text(cfg)
-    if isinstance(graph, str):
-        graph = nx_pydot.read_dot(graph)
-    cfg = cfg_into_weak_cnf(cfg)
-    eps = [pr.head for pr in cfg.productions if not pr.body]
-    terminals = []
-    variables = []
-    for pr in cfg.productions:
-        if pr.body and isinstance(pr.body[0], Terminal):
-            terminals.append(pr)
-        if pr.body and isinstance(pr.body[0], Variable):
-            variables.append(pr)
-    T = {
-        var: dok_matrix((len(graph.nodes), len(graph.nodes)), dtype=bool)
-        for var in cfg.variables
+    grammar = compile_grammar(cfg)
+    index = load_graph_index(graph)
+    T = get_base_matrices(index, grammar)
+    backend = get_backend(backend, T.values())
+    T = {var: backend.from_sparse(m) for var, m in T.items()}
+    if semi_naive:
+        _semi_naive_closure(T, grammar.binary_productions, backend, stats)
+    else:
+        _naive_closure(T, grammar.binary_productions, backend, stats)
+    nodes = index.nodes
+    r = {
+        (var, nodes[u], nodes[v])
+        for var, m in T.items()
+        for u, v in zip(*backend.nonzero(m))
     }
-    for i, j, x in graph.edges(data=True):
-        for pr in terminals:
-            if pr.body[0] == Terminal(x["label"]):
-                T[pr.head][int(i), int(j)] = True
+    return r
+
 
-    for i in range(len(graph.nodes)):
-        for e in eps:
-            T[e][i, i] = True
+def get_base_matrices(index: GraphIndex, grammar: CompiledGrammar):
+    """
+        Matrices of paths derived by one production A -> a or A -> epsilon
 
-    changed = False
+    :param index: index of the graph
+    :param grammar: compiled grammar
+    :return: csr matrix for each nonterminal of the grammar
+    """
+    n = index.number_of_nodes
+    T = {var: csr_matrix((n, n), dtype=bool) for var in grammar.variables}
+    for t, heads in grammar.terminal_heads.items():
+        if t in index.matrices:
+            for head in heads:
+                T[head] = T[head] + index.matrices[t]
+    for head in grammar.eps_heads:
+        T[head] = T[head] + diags([True] * n, dtype=bool, format="csr")
+    return T
+
+
+def _naive_closure(T, productions, backend, stats=None):
+    """
+        Recomputes T[A] += T[B] * T[C] for every production A -> B C
+        until no matrix changes
+    :param T: boolean matrix for each nonterminal, updated in place
+    :param productions: productions A -> B C as (A, B, C) triples
+    :param backend: backend of the matrices
+    :param stats: EngineStats or None
+    """
     changing = True
+    iteration = 0
     while changing:
-        for v in variables:
-            x = T[v.head].getnnz()
-            T[v.head] += T[v.body[0]].dot(T[v.body[1]])
-            to = T[v.head].getnnz()
-            changed = to != x
-        changing = changed or False
-    r = {(var, u, v) for var, m in T.items() for u, v in zip(*m.nonzero())}
-    return r
+        changing = False
+        iteration += 1
+        begin = time.perf_counter()
+        added = {}
+        for head, left, right in productions:
+            x = backend.nnz(T[head])
+            product = multiply(
+                backend,
+                T[left],
+                T[right],
+                stats,
+                "matrix",
+                iteration,
+                f"{head} -> {left} {right}",
+            )
+            T[head] = backend.add(T[head], product)
+            growth = backend.nnz(T[head]) - x
+            added[head] = added.get(head, 0) + growth
+            changing |= growth != 0
+        if stats is not None:
+            stats.record_iteration(
+                "matrix", iteration, time.perf_counter() - begin, T, backend, added
+            )
+
+
+def _semi_naive_closure(T, productions, backend, stats=None):
+    """
+        Semi-naive fixpoint: on each round only the pairs added on the previous
+        round are multiplied, since T[B] * T[C] minus the already known product
+        is covered by delta[B] * T[C] + old[B] * delta[C]
+    :param T: boolean matrix for each nonterminal, updated in place
+    :param productions: productions A -> B C as (A, B, C) triples
+    :param backend: backend of the matrices
+    :param stats: EngineStats or None
+    """
+    # only nonterminals with a non-empty delta are kept
+    delta = {var: m for var, m in T.items() if backend.nnz(m)}
+    old = {}
+    iteration = 0
+    while delta:
+        iteration += 1
+        begin = time.perf_counter()
+        new = {}
+        for head, left, right in productions:
+            products = []
+            name = f"{head} -> {left} {right}"
+            if left in delta:
+                products.append(
+                    multiply(
+                        backend, delta[left], T[right], stats, "matrix", iteration, name
+                    )
+                )
+            if right in delta and left in old and backend.nnz(old[left]):
+                products.append(
+                    multiply(
+                        backend,
+                        old[left],
+                        delta[right],
+                        stats,
+                        "matrix",
+                        iteration,
+                        name,
+                    )
+                )
+            for product in products:
+                new[head] = backend.add(new[head], product) if head in new else product
+        # matrices in T are replaced rather than modified, so a shallow copy is enough
+        old = dict(T)
+        delta = {}
+        for var, m in new.items():
+            added = backend.difference(m, T[var])
+            if backend.nnz(added):
+                delta[var] = added
+                T[var] = backend.add(T[var], added)
+        if stats is not None:
+            stats.record_iteration(
+                "matrix",
+                iteration,
+                time.perf_counter() - begin,
+                T,
+                backend,
+                {var: backend.nnz(m) for var, m in delta.items()},
+            )
+
+
+def _take_rows(matrix, rows):
+    """
+        Csr matrix of the rows of the csr matrix, a negative index gives an empty row
+
+    :param matrix: csr matrix
+    :param rows: array of indices of the rows
+    :return: csr matrix with len(rows) rows
+    """
+    valid = rows >= 0
+    starts = matrix.indptr[rows[valid]]
+    counts = matrix.indptr[rows[valid] + 1] - starts
+    lengths = np.zeros(len(rows), dtype=np.int64)
+    lengths[valid] = counts
+    positions = np.repeat(starts, counts) + (
+        np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    )
+    return csr_matrix(
+        (
+            matrix.data[positions],
+            matrix.indices[positions],
+            np.concatenate([[0], np.cumsum(lengths)]),
+        ),
+        shape=(len(rows), matrix.shape[1]),
+    )
+
+
+def _map_columns(matrix, local, size):
+    """
+        Renumbers the columns of the csr matrix by the array from a column to its new index,
+        the columns without an index (-1) are dropped
+
+    :param matrix: csr matrix
+    :param local: array from a column to its new index
+    :param size: number of the new columns
+    :return: csr matrix
+    """
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    cols = local[matrix.indices]
+    keep = cols >= 0
+    return csr_matrix(
+        (matrix.data[keep], (rows[keep], cols[keep])),
+        shape=(matrix.shape[0], size),
+        dtype=bool,
+    )
+
+
+def _add_rows(matrix, count):
+    """
+    Appends empty rows to the csr matrix
+    """
+    indptr = np.concatenate([matrix.indptr, np.full(count, matrix.indptr[-1])])
+    return csr_matrix(
+        (matrix.data, matrix.indices, indptr),
+        shape=(matrix.shape[0] + count, matrix.shape[1]),
+    )
+
+
+def multiple_source_matrix(
+    graph,
+    cfg,
+    start_vertex,
+    start_symbol=Variable("S"),
+    backend="auto",
+    semi_naive=True,
+    stats=None,
+):
+    """
+        Multiple-source version of the Matrix algorithm: for every nonterminal
+        only the rows of the vertices from which its paths are actually needed
+        are computed, so the work is bounded by the part of the graph
+        reachable from the start vertices.
+        The rows of a nonterminal are stored compactly in the order its sources are found,
+        a round of the fixpoint handles only the new sources and the new paths of the previous one
+    :param graph: the graph representation of the automaton (MultiDiGraph or GraphIndex)
+    :param cfg: context-free grammar as object (can be string, CFG or CompiledGrammar object)
+    :param start_vertex: the vertices from which paths are searched
+    :param start_symbol: start symbol, S by default
+    :param backend: backend of boolean matrix operations of the products, see get_backend
+    :param semi_naive: multiply only the paths added on the previous round (true)
+        or all the paths of the sources on each round (false)
+    :param stats: EngineStats receiving the rounds with the numbers of sources and the products,
+        nothing is measured if None
+    :return: a set of pairs of vertices connected by a path derived from start_symbol
+    """
+    grammar = compile_grammar(cfg)
+    index = get_graph_index(graph)
+    nodes = index.nodes
+    n = index.number_of_nodes
+    if start_symbol not in grammar.variables:
+        return set()
+    # the rows of base[A] are the one-step A-paths
+    base = get_base_matrices(index, grammar)
+    backend = get_backend(backend, base.values())
+    productions = grammar.binary_productions
+
+    # sources[A] are the vertices of the rows of T[A], local[A] maps a vertex to its row
+    sources = {var: np.zeros(0, dtype=np.int64) for var in grammar.variables}
+    local = {var: np.full(n, -1, dtype=np.int64) for var in grammar.variables}
+    T = {var: csr_matrix((0, n), dtype=bool) for var in grammar.variables}
+    delta = dict(T)
+    # vertices found to be sources on the previous round, they get the rows
+    # from first[A] at the end of T[A]
+    starts = index.get_ids(start_vertex)
+    found = {start_symbol: [starts]}
+
+    def multiply_rows(a, b, right, name):
+        # the columns of a are vertices, they are renumbered to the rows of b
+        a = _map_columns(a, local[right], b.shape[0])
+        return backend.to_sparse(
+            multiply(
+                backend,
+                backend.from_sparse(a),
+                backend.from_sparse(b),
+                stats,
+                "matrix",
+                iteration,
+                name,
+            )
+        )
+
+    iteration = 0
+    begin = time.perf_counter()
+    while True:
+        first = {var: len(m) for var, m in sources.items()}
+        for var, vertices in found.items():
+            vertices = np.unique(np.concatenate(vertices))
+            vertices = vertices[local[var][vertices] < 0]
+            local[var][vertices] = np.arange(len(vertices)) + first[var]
+            sources[var] = np.concatenate([sources[var], vertices])
+            T[var] = _add_rows(T[var], len(vertices))
+            delta[var] = _add_rows(delta[var], len(vertices))
+        if stats is not None and iteration:
+            stats.record_iteration(
+                "matrix",
+                iteration,
+                time.perf_counter() - begin,
+                T,
+                get_backend("sparse"),
+                {var: m.nnz for var, m in delta.items()},
+                sources=sum(len(m) for m in sources.values()),
+                added_sources=sum(len(m) - first[var] for var, m in sources.items()),
+            )
+        if not found and not any(m.nnz for m in delta.values()):
+            break
+        iteration += 1
+        begin = time.perf_counter()
+
+        candidates = {}
+        for var in grammar.variables:
+            # one-step paths of the new sources, or of all of them for the naive fixpoint
+            vertices = sources[var].copy()
+            if semi_naive:
+                vertices[: first[var]] = -1
+            candidates[var] = [_take_rows(base[var], vertices)]
+        found = {}
+        for head, left, right in productions:
+            # A -> B C: the rows of T[B] for sources of A, their ends are sources of C
+            rows = local[left][sources[head]]
+            reached = _take_rows(T[left], rows)
+            new = reached
+            if semi_naive:
+                # the rows of the new sources of A and the new paths of B from the old ones
+                kept = np.arange(len(rows))
+                kept[: first[head]] = -1
+                new = _take_rows(reached, kept) + _take_rows(delta[left], rows)
+            found.setdefault(left, []).append(sources[head][first[head] :])
+            found.setdefault(right, []).append(new.indices)
+            name = f"{head} -> {left} {right}"
+            if new.nnz:
+                candidates[head].append(multiply_rows(new, T[right], right, name))
+            if semi_naive and delta[right].nnz and reached.nnz:
+                candidates[head].append(
+                    multiply_rows(reached, delta[right], right, name)
+                )
+        for var, products in candidates.items():
+            added = csr_matrix(T[var].shape, dtype=bool)
+            for product in products:
+                added = added + product
+            delta[var] = added > T[var]
+            T[var] = T[var] + delta[var]
+        found = {
+            var: vertices
+            for var, vertices in found.items()
+            if any((local[var][v] < 0).any() for v in vertices)
+        }
+
+    # sources of the start symbol may grow beyond the start vertices
+    result = _take_rows(T[start_symbol], local[start_symbol][starts])
+    return {(nodes[starts[v]], nodes[u]) for v, u in zip(*result.nonzero())}
 
 
 def context_free_path_querying_by_hellinges(
-    graph: MultiDiGraph,
+    graph,
     cfg: CFG,
     start_vertex=None,
     end_vertex=None,
@@ -153,47 +565,62 @@ def context_free_path_querying_by_hellinges(
 ):
     """
         Based on the Hellings algorithm solves the reachability problem
-    :param graph: the graph representation of the automaton
+    :param graph: the graph representation of the automaton (path_to_file, MultiDiGraph or GraphIndex)
     :param cfg: context-free grammar as object
     :param start_vertex: the vertices that are the starting values of the automaton
     :param end_vertex: the vertices that are finite values of the automaton
     :param start_symbol: start symbol, S by default
     :return:
     """
+    index = load_graph_index(graph)
     if start_vertex is None:
-        start_vertex = graph.nodes
+        start_vertex = index.vertices
     if end_vertex is None:
-        end_vertex = graph.nodes
+        end_vertex = index.vertices
     return {
         (v, u)
-        for (nt, v, u) in hellinges(graph, cfg)
+        for (nt, v, u) in hellinges(index, cfg)
         if v in start_vertex and u in end_vertex and nt == start_symbol
     }
 
 
 def context_free_path_querying_by_matrix(
-    graph: MultiDiGraph,
+    graph,
     cfg: CFG,
     start_vertex=None,
     end_vertex=None,
     start_symbol=Variable("S"),
+    semi_naive=True,
+    backend="auto",
+    stats=None,
 ):
     """
         Based on the Matrix algorithm solves the reachability problem
-    :param graph: the graph representation of the automaton
+    :param graph: the graph representation of the automaton (path_to_file, MultiDiGraph or GraphIndex)
     :param cfg: context-free grammar as object
     :param start_vertex: the vertices that are the starting values of the automaton
     :param end_vertex: the vertices that are finite values of the automaton
     :param start_symbol: start symbol, S by default
+    :param semi_naive: use the semi-naive fixpoint of the Matrix algorithm,
+        with or without start vertices
+    :param backend: backend of boolean matrix operations, see get_backend
+    :param stats: EngineStats of the fixpoint, see matrix and multiple_source_matrix
     :return:
     """
-    if start_vertex is None:
-        start_vertex = graph.nodes
+    index = load_graph_index(graph)
     if end_vertex is None:
-        end_vertex = graph.nodes
+        end_vertex = index.vertices
+    if start_vertex is not None:
+        return {
+            (v, u)
+            for (v, u) in multiple_source_matrix(
+                index, cfg, start_vertex, start_symbol, backend, semi_naive, stats
+            )
+            if u in end_vertex
+        }
 
     return {
         (v, u)
-        for (nt, v, u) in matrix(graph, cfg)
-        if v in start_vertex and u in end_vertex and nt == start_symbol
+        for (nt, v, u) in matrix(index, cfg, semi_naive, backend, stats)
+        if u in end_vertex and nt == start_symbol
     }
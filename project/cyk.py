@@ -0,0 +1,186 @@
+import numpy as np
+from pyformlang.cfg import CFG, Variable
+
+from project.cache import LRUCache, load_from_disk, store_on_disk
+from project.context_free_grammar import (
+    get_cfg_from_file,
+    get_cfg_from_text,
+    get_grammar_fingerprint,
+)
+
+CNF_CACHE = LRUCache(maxsize=64)
+# words of one length checked at once, the table of a word takes length ** 2 / 2 masks
+CYK_CHUNK_SIZE = 2**14
+
+
+class CompiledCNF:
+    """
+    Grammar in Chomsky's normal form with a bit for every nonterminal:
+    the set of nonterminals deriving a substring is a mask of uint64 words,
+    so a cell of the CYK table is filled by ORs of the masks of production heads
+    """
+
+    def __init__(self, cfg: CFG):
+        self.generates_epsilon = cfg.generate_epsilon()
+        cnf = cfg.to_normal_form()
+        # the order of the bits does not depend on the order of the productions
+        self.variables = sorted(cnf.variables, key=lambda var: str(var.value))
+        bits = {var: i for (i, var) in enumerate(self.variables)}
+        self.number_of_words = max(1, (len(self.variables) + 63) // 64)
+        # bit of the start symbol, None if the grammar derives no nonempty word
+        self.start = bits.get(cnf.start_symbol)
+        # terminal value of A -> a to the mask of the heads
+        self.terminal_masks = {}
+        # B of A -> B C to the list of C and the mask of the heads
+        self.binary_masks = {}
+        heads = {}
+        for production in cnf.productions:
+            if len(production.body) == 1:
+                mask = self.terminal_masks.setdefault(
+                    production.body[0].value, self.get_empty_mask()
+                )
+                self._set_bit(mask, bits[production.head])
+            elif len(production.body) == 2:
+                left, right = (bits[symbol] for symbol in production.body)
+                mask = heads.setdefault((left, right), self.get_empty_mask())
+                self._set_bit(mask, bits[production.head])
+        for (left, right), mask in sorted(heads.items()):
+            self.binary_masks.setdefault(left, []).append((right, mask))
+
+    def get_empty_mask(self):
+        return np.zeros(self.number_of_words, dtype=np.uint64)
+
+    @staticmethod
+    def _set_bit(mask, bit):
+        mask[bit >> 6] |= np.uint64(1) << np.uint64(bit & 63)
+
+
+def compile_cnf(cfg, start_symbol=Variable("S"), cache_dir=None) -> CompiledCNF:
+    """
+        Converts grammar into Chomsky's normal form with masks of nonterminals,
+        reusing the result for grammars with the same fingerprint
+
+    :param cfg: context-free grammar as object, as a path to a file or a string, or already compiled
+    :param start_symbol: start symbol, S by default, for cfg as a string
+    :param cache_dir: directory of the on-disk cache, it is not used if None
+    :return: compiled grammar
+    """
+    if isinstance(cfg, CompiledCNF):
+        return cfg
+    if isinstance(cfg, str):
+        try:
+            cfg = get_cfg_from_file(cfg, start_symbol)
+        except OSError:
+            cfg = get_cfg_from_text(cfg, start_symbol)
+    fingerprint = "cnf-" + get_grammar_fingerprint(cfg)
+    compiled = CNF_CACHE.get(fingerprint)
+    if compiled is None and cache_dir is not None:
+        compiled = load_from_disk(cache_dir, fingerprint)
+    if compiled is None:
+        compiled = CompiledCNF(cfg)
+        if cache_dir is not None:
+            store_on_disk(cache_dir, fingerprint, compiled)
+    CNF_CACHE.put(fingerprint, compiled)
+    return compiled
+
+
+def _get_bits(masks, bit):
+    """
+    Boolean array of the bit in the masks stored along the last axis
+    """
+    return ((masks[..., bit >> 6] >> np.uint64(bit & 63)) & np.uint64(1)).astype(bool)
+
+
+def _cyk_same_length(ids, grammar: CompiledCNF, terminal_masks):
+    """
+        CYK for words of one length: the table holds for every length of a substring
+        the masks of all its starts in all words, so every production is applied
+        to all cells of a length at once
+
+    :param ids: array (number of words, length) of ids of the terminals
+    :param grammar: compiled grammar
+    :param terminal_masks: masks of the terminals by their ids
+    :return: boolean array, whether the word is derived from the start symbol
+    """
+    number_of_words, length = ids.shape
+    if length == 0:
+        return np.full(number_of_words, grammar.generates_epsilon)
+    if grammar.start is None:
+        return np.zeros(number_of_words, dtype=bool)
+    # table[l] has the shape (length - l + 1, number of words, words of a mask)
+    table = [None, terminal_masks[ids.T]]
+    for span in range(2, length + 1):
+        starts = length - span + 1
+        cells = np.zeros(
+            (starts, number_of_words, grammar.number_of_words), dtype=np.uint64
+        )
+        for split in range(1, span):
+            left = table[split][:starts]
+            right = table[span - split][split : split + starts]
+            for left_bit, productions in grammar.binary_masks.items():
+                has_left = _get_bits(left, left_bit)
+                if not has_left.any():
+                    continue
+                for right_bit, mask in productions:
+                    derived = has_left & _get_bits(right, right_bit)
+                    cells[derived] |= mask
+        table.append(cells)
+    return _get_bits(table[length][0], grammar.start)
+
+
+def cyk_batch(words, cfg, chunk_size=CYK_CHUNK_SIZE):
+    """
+        Checks whether the words are derived in the grammar by CYK,
+        the words are grouped by length and the words of a length are checked together
+
+    :param words: words as sequences of terminals, a string is a sequence of characters
+    :param cfg: context-free grammar as object, as a path to a file or a string, or compiled by compile_cnf
+    :param chunk_size: maximum number of words of one length checked at once
+    :return: boolean array, whether the word is derived
+    """
+    grammar = compile_cnf(cfg)
+    # unknown terminals get the id of the empty mask
+    terminals = {terminal: i for (i, terminal) in enumerate(grammar.terminal_masks)}
+    terminal_masks = np.stack(
+        list(grammar.terminal_masks.values()) + [grammar.get_empty_mask()]
+    )
+    unknown = len(terminals)
+    words = words if isinstance(words, list) else list(words)
+    by_length = {}
+    for i, word in enumerate(words):
+        by_length.setdefault(len(word), []).append(i)
+    result = np.zeros(len(words), dtype=bool)
+    for length, positions in by_length.items():
+        for begin in range(0, len(positions), chunk_size):
+            chunk = positions[begin : begin + chunk_size]
+            ids = np.array(
+                [
+                    [terminals.get(symbol, unknown) for symbol in words[i]]
+                    for i in chunk
+                ],
+                dtype=np.int64,
+            ).reshape(len(chunk), length)
+            result[chunk] = _cyk_same_length(ids, grammar, terminal_masks)
+    return result
+
+
+def cyk(word, cfg) -> bool:
+    """
+        Checks whether the word is derived in the grammar by CYK
+
+    :param word: sequence of terminals, a string is a sequence of characters
+    :param cfg: context-free grammar as object, as a path to a file or a string, or compiled by compile_cnf
+    :return: true if the word is derived
+    """
+    return bool(cyk_batch([word], cfg)[0])
+
+
+def get_words_from_file(file_name: str):
+    """
+        Reads words from the file, one word in a line with terminals separated by spaces
+
+    :param file_name: file name for read
+    :return: list of words as lists of terminals
+    """
+    with open(file_name, "r") as file:
+        return [line.split() for line in file.read().splitlines()]
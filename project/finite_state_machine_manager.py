@@ -1,11 +1,27 @@
+import hashlib
+import time
 from collections import namedtuple
 
-from pyformlang.finite_automaton import State, DeterministicFiniteAutomaton, EpsilonNFA
+import numpy as np
+from pyformlang.finite_automaton import DeterministicFiniteAutomaton, EpsilonNFA
 from pyformlang.regular_expression import Regex
-from scipy.sparse import dok_matrix, vstack
+from scipy.sparse import dok_matrix
 from cfpq_data import *
 
+from project.boolean_backend import get_backend
+from project.cache import LRUCache, load_from_disk, store_on_disk
+from project.graph_index import get_graph_index
 from project.matrix_manager import *
+from project.stats import multiply
+
+# bytes for the visited states of a chunk of start vertices in ms_rpq
+MS_RPQ_MEMORY_BUDGET = 256 * 2**20
+# bytes of a visited state of BFS: its column and value in the visited, reached and front matrices
+VISITED_STATE_BYTES = 15
+# start vertices of the first chunk, the next chunks are sized by the states visited per start vertex
+MS_RPQ_FIRST_CHUNK_SIZE = 64
+
+QUERY_CACHE = LRUCache(maxsize=256)
 
 
 def create_dfsm_by_regular_expression(regular: str):
@@ -19,6 +35,66 @@ def create_dfsm_by_regular_expression(regular: str):
     return Regex(regular).to_epsilon_nfa().minimize()
 
 
+class CompiledQuery:
+    """
+    Minimal deterministic automaton of a regular expression
+    with the matrices and masks used by the RPQ algorithms
+    """
+
+    def __init__(self, regex: str):
+        self.regex = regex
+        self.dfa = create_dfsm_by_regular_expression(regex)
+        # boolean matrices, states, start and final states mapped to their indices
+        self.info = get_graph_info(self.dfa)
+        self.start_states = sorted(self.info.start_states.values())
+        self.final_states = sorted(self.info.final_states.values())
+        self.start_mask = np.zeros(self.number_of_states, dtype=bool)
+        self.start_mask[self.start_states] = True
+        self.final_mask = np.zeros(self.number_of_states, dtype=bool)
+        self.final_mask[self.final_states] = True
+
+    @property
+    def matrices(self):
+        return self.info.boolean_matrix
+
+    @property
+    def number_of_states(self):
+        return len(self.info.all_states)
+
+
+def get_regex_fingerprint(regex: str) -> str:
+    """
+        Fingerprint of a regular expression that does not depend on the whitespace
+
+    :param regex: regular expression
+    :return: hex digest of the normalized regular expression
+    """
+    return hashlib.sha256(" ".join(regex.split()).encode("utf-8")).hexdigest()
+
+
+def compile_query(regex, cache_dir=None) -> CompiledQuery:
+    """
+        Builds the minimal automaton of the regular expression and its matrices,
+        reusing the result for regular expressions with the same fingerprint
+
+    :param regex: regular expression as a string or already compiled
+    :param cache_dir: directory of the on-disk cache, it is not used if None
+    :return: compiled query
+    """
+    if isinstance(regex, CompiledQuery):
+        return regex
+    fingerprint = get_regex_fingerprint(regex)
+    compiled = QUERY_CACHE.get(fingerprint)
+    if compiled is None and cache_dir is not None:
+        compiled = load_from_disk(cache_dir, fingerprint)
+    if compiled is None:
+        compiled = CompiledQuery(" ".join(regex.split()))
+        if cache_dir is not None:
+            store_on_disk(cache_dir, fingerprint, compiled)
+    QUERY_CACHE.put(fingerprint, compiled)
+    return compiled
+
+
 def create_ndfsm_by_graph(graph, start_vertex=None, end_vertex=None):
     """
         Constructs a nondeterministic finite automaton over the graph
@@ -40,95 +116,224 @@ def create_ndfsm_by_graph(graph, start_vertex=None, end_vertex=None):
     return ndfsm
 
 
-def ap_rpq(graph, regular: str, start_vertex=None, end_vertex=None):
+def ap_rpq(
+    graph,
+    regular: str,
+    start_vertex=None,
+    end_vertex=None,
+    lazy=False,
+    output="list",
+    backend="auto",
+    stats=None,
+):
     """
     Performs regular graph queries: on a graph with given start and end vertices
     and a regular expression, return those pairs of vertices from the given start and end vertices
     that are connected by a path forming a word from the language given by the regular expression.
-    :param graph: query graph
-    :param regular:
+    :param graph: query graph (MultiDiGraph or GraphIndex)
+    :param regular: regular expression as a string or CompiledQuery
     :param start_vertex: starting vertices of the graph
     :param end_vertex: final vertices of the graph
+    :param lazy: build only the part of the intersection reachable
+        from the pairs of start states instead of the full Kronecker product
+    :param output: "list" of pairs of start and end nodes, "matrix" as a boolean csr matrix
+        over ids of the GraphIndex, or "generator" yielding the pairs one by one
+    :param backend: backend of boolean matrix operations of the closure, see get_backend
+    :param stats: EngineStats of the transitive closure, nothing is measured if None
     :return: list of start and end nodes
     """
-    graph_fst = create_ndfsm_by_graph(graph, start_vertex, end_vertex)
-    graph_snd = create_dfsm_by_regular_expression(regular)
-    boolean_matrix_fst = get_boolean_matrix(graph_fst)
-    boolean_matrix_snd = get_boolean_matrix(graph_snd)
-    result_transitive = transitive_closure(
-        get_graph_intersection_by_matrix(boolean_matrix_fst, boolean_matrix_snd)
+    index = get_graph_index(graph)
+    query = compile_query(regular)
+    start_fst = index.get_ids(start_vertex)
+    if lazy:
+        intersection, states = get_reachable_graph_intersection(
+            index.matrices,
+            query.matrices,
+            start_fst,
+            query.start_states,
+            (index.number_of_nodes, query.number_of_states),
+        )
+    else:
+        intersection = get_graph_intersection_by_matrix(index.matrices, query.matrices)
+        states = None
+    result = get_answer_matrix(
+        transitive_closure(intersection, backend=backend, stats=stats),
+        states,
+        (start_fst, query.start_states),
+        (index.get_ids(end_vertex), query.final_states),
+        (index.number_of_nodes, query.number_of_states),
     )
-    all_state_fst = {start: i for (i, start) in enumerate(graph_fst.states)}
-    all_state_snd = {start: i for (i, start) in enumerate(graph_snd.states)}
-    list_start = {}
-    list_end = {}
-    for index_fst in all_state_fst:
-        for index_snd in all_state_snd:
-            new_state = (
-                all_state_fst[index_fst] * len(list(graph_snd.states))
-                + all_state_snd[index_snd]
-            )
-            if (
-                index_fst in graph_fst.start_states
-                and index_snd in graph_snd.start_states
-            ):
-                list_start[new_state] = index_fst
-            if (
-                index_fst in graph_fst.final_states
-                and index_snd in graph_snd.final_states
-            ):
-                list_end[new_state] = index_fst
-    result = []
-    for start, end in zip(*result_transitive.nonzero()):
-        if start in list_start and end in list_end:
-            result.append((list_start[start], list_end[end]))
-    return result
+    if output == "matrix":
+        return result
+    if output == "generator":
+        return iterate_pairs(result, index.nodes)
+    if output == "list":
+        return list(iterate_pairs(result, index.nodes))
+    raise ValueError(f"Unknown output format: {output}")
+
+
+def ap_rpq_batch(
+    graph,
+    regexes,
+    start_vertex=None,
+    end_vertex=None,
+    lazy=True,
+    output="list",
+    backend="auto",
+    stats=None,
+):
+    """
+    Performs several regular graph queries on one graph at once: the automata of the queries
+    are joined into one automaton with a block for each query, so the graph matrices,
+    the intersection and its transitive closure are built once for all queries,
+    and the answer of a query is read from the final states of its block
+    :param graph: query graph (MultiDiGraph or GraphIndex)
+    :param regexes: regular expressions as strings or CompiledQuery
+    :param start_vertex: starting vertices of the graph
+    :param end_vertex: final vertices of the graph
+    :param lazy: build only the part of the intersection reachable from the pairs of start states,
+        the joined automaton makes the full intersection large, so it is the default here
+    :param output: format of the answers, the same as in ap_rpq
+    :param backend: backend of boolean matrix operations of the closure, see get_backend
+    :param stats: EngineStats of the transitive closure, nothing is measured if None
+    :return: list of answers in the order of the regular expressions
+    """
+    index = get_graph_index(graph)
+    queries = [compile_query(regex) for regex in regexes]
+    if not queries:
+        return []
+    matrices, offsets = get_block_automaton(queries)
+    starts = [offset + np.array(q.start_states) for q, offset in zip(queries, offsets)]
+    finals = [offset + np.array(q.final_states) for q, offset in zip(queries, offsets)]
+    shape = (index.number_of_nodes, offsets[-1] + queries[-1].number_of_states)
+    start_fst = index.get_ids(start_vertex)
+    end_fst = index.get_ids(end_vertex)
+    if lazy:
+        intersection, states = get_reachable_graph_intersection(
+            index.matrices, matrices, start_fst, np.concatenate(starts), shape
+        )
+    else:
+        intersection = get_graph_intersection_by_matrix(index.matrices, matrices)
+        states = None
+    closure = transitive_closure(intersection, backend=backend, stats=stats)
+
+    answers = []
+    for start, final in zip(starts, finals):
+        result = get_answer_matrix(
+            closure, states, (start_fst, start), (end_fst, final), shape
+        )
+        if output == "matrix":
+            answers.append(result)
+        elif output == "generator":
+            answers.append(iterate_pairs(result, index.nodes))
+        elif output == "list":
+            answers.append(list(iterate_pairs(result, index.nodes)))
+        else:
+            raise ValueError(f"Unknown output format: {output}")
+    return answers
+
+
+def get_block_automaton(queries):
+    """
+    Joins the automata of the queries into one automaton with a block for each of them
+
+    :param queries: compiled queries
+    :return: boolean matrices of the joined automaton by symbols
+        and the offsets of the states of the queries
+    """
+    offsets = np.cumsum([0] + [q.number_of_states for q in queries])
+    edges = {}
+    for query, offset in zip(queries, offsets):
+        for symbol, m in query.matrices.items():
+            rows, cols = m.nonzero()
+            label_rows, label_cols = edges.setdefault(symbol, ([], []))
+            label_rows.append(rows + offset)
+            label_cols.append(cols + offset)
+    matrices = {
+        symbol: sparse.csr_matrix(
+            (
+                np.ones(sum(len(r) for r in rows), dtype=bool),
+                (np.concatenate(rows), np.concatenate(cols)),
+            ),
+            shape=(offsets[-1], offsets[-1]),
+        )
+        for symbol, (rows, cols) in edges.items()
+    }
+    return matrices, offsets[:-1]
 
 
-def transform(matrix, length):
+def get_answer_matrix(closure, states, starts, finals, shape):
+    """
+    Decodes the closure of the intersection into pairs of vertices of the first automaton
+    with index arithmetic, only the rows of pairs of start states are looked at
+
+    :param closure: transitive closure of the intersection
+    :param states: indices of the rows of the closure in the full intersection,
+        None if the closure is built over the full intersection
+    :param starts: ids of start states of the first and of the second automaton
+    :param finals: ids of final states of the first and of the second automaton
+    :param shape: numbers of states of the first and of the second automaton
+    :return: boolean csr matrix of pairs of connected start and final states of the first automaton
     """
-        Transforms matrix to the mathix with only ones at the main diagonal
+    shape_fst, shape_snd = shape
+    start_rows = (
+        np.asarray(starts[0], dtype=np.int64)[:, None] * shape_snd
+        + np.asarray(starts[1], dtype=np.int64)[None, :]
+    ).reshape(-1)
+    if states is not None:
+        # the lazy intersection holds every pair of start states
+        start_rows = np.searchsorted(states, start_rows)
+    rows, cols = closure[start_rows].nonzero()
+    rows = start_rows[rows]
+    if states is not None:
+        rows, cols = states[rows], states[cols]
+    start, _ = np.divmod(rows, shape_snd)
+    end, end_snd = np.divmod(cols, shape_snd)
+    final_fst = np.zeros(shape_fst, dtype=bool)
+    final_fst[np.asarray(finals[0], dtype=np.int64)] = True
+    final_snd = np.zeros(shape_snd, dtype=bool)
+    final_snd[np.asarray(finals[1], dtype=np.int64)] = True
+    keep = final_fst[end] & final_snd[end_snd]
+    result = sparse.csr_matrix(
+        (np.ones(keep.sum(), dtype=bool), (start[keep], end[keep])),
+        shape=(shape_fst, shape_fst),
+    )
+    result.sum_duplicates()
+    return result
 
-    :param matrix: front
-    :param length: count of states in the second graph
-    :return: transformed dok_matrix front
+
+def iterate_pairs(matrix, nodes):
     """
-    mathix_transformed = dok_matrix(matrix.shape, dtype=bool)
-    for x, y in zip(*matrix.nonzero()):
-        if y < length:
-            row = matrix[[x], length:]
-            if row.nnz > 0:
-                shift = x - (x % length)
-                mathix_transformed[shift + y, y] = True
-                mathix_transformed[[shift + y], length:] += row
-    return mathix_transformed
+    Yields pairs of names of vertices for the nonzero entries of the csr matrix row by row
+    """
+    for v in range(matrix.shape[0]):
+        for u in matrix.indices[matrix.indptr[v] : matrix.indptr[v + 1]]:
+            yield nodes[v], nodes[u]
 
 
 def front_each(fst_info, snd_info):
     """
-        Calculates front for separated each start state
+        Calculates front for separated each start state,
+        the blocks of all start states are built at once
 
     :param fst_info: info about first graph
     :param snd_info: info about second graph
     :return: created front
     """
-    front = None
-    for s in fst_info.start_states:
-        temp_front = dok_matrix(
-            (
-                len(snd_info.all_states),
-                len(fst_info.all_states) + len(snd_info.all_states),
-            ),
-            dtype=bool,
-        )
-        r = dok_matrix((1, len(fst_info.all_states)), dtype=bool)
-        r[0, fst_info.start_states[s]] = True
-        for state in snd_info.start_states:
-            i = snd_info.all_states[state]
-            temp_front[i, i] = True
-            temp_front[[i], len(snd_info.all_states) :] = r
-        front = temp_front if front is None else vstack([front, temp_front])
-    return front
+    length = len(snd_info.all_states)
+    starts = np.fromiter(fst_info.start_states.values(), dtype=np.int64)
+    states = np.fromiter(snd_info.start_states.values(), dtype=np.int64)
+    rows = np.repeat(np.arange(len(starts)) * length, len(states)) + np.tile(
+        states, len(starts)
+    )
+    cols = np.repeat(starts, len(states)) + length
+    return sparse.csr_matrix(
+        (
+            np.ones(2 * len(rows), dtype=bool),
+            (np.concatenate([rows, rows]), np.concatenate([rows % length, cols])),
+        ),
+        shape=(len(starts) * length, len(fst_info.all_states) + length),
+    )
 
 
 def front_all(fst_info, snd_info):
@@ -150,96 +355,275 @@ def front_all(fst_info, snd_info):
     for s in fst_info.start_states:
         front_right[0, fst_info.start_states[s]] = True
     for s in snd_info.start_states:
-        index = snd_info.all_states[s]
+        index = snd_info.start_states[s]
         front[index, index] = True
         front[[index], len(snd_info.all_states) :] = front_right
     return front
 
 
-def BFS(fst_graph_info, snd_graph_info, for_each: bool):
+def BFS(fst_graph_info, snd_graph_info, for_each: bool, backend="auto", stats=None):
     """
-        BFS to calculate direct sums, fronts (for each or for all states) and perform bfs in cycle while front is changing
+        BFS over the direct sums: calculates fronts (for each or for all states)
+        and perform bfs in cycle while the front has not visited states.
+        Rows of the front always hold their state on the diagonal of the block,
+        so a step by a symbol moves the vertices reached in the graph
+        to the rows of the states reached in the second graph,
+        and only the vertices that were not visited yet are multiplied on the next step.
+        The visited states are kept in a sparse matrix, so the work and the memory
+        grow with the reachable states rather than with the size of the product.
+        The backend is chosen by the matrices of the graph and the front,
+        the moves are always sparse
 
     :param fst_graph_info: boolean matrix, all states, final and start states for the first graph
     :param snd_graph_info: boolean matrix, all states, final and start states for the second graph
     :param for_each: create front for all states (false) or for each (true)
+    :param backend: backend of boolean matrix operations, see get_backend
+    :param stats: EngineStats receiving the steps of BFS and the products by label,
+        nothing is measured if None
     :return: all visited after bfs states
     """
-    direct_sum = dict()
-    for symbol in fst_graph_info.boolean_matrix:
-        if symbol in snd_graph_info.boolean_matrix:
-            direct_sum[symbol] = sparse.bmat(
-                [
-                    [snd_graph_info.boolean_matrix[symbol], None],
-                    [None, fst_graph_info.boolean_matrix[symbol]],
-                ]
-            )
-
     front = (
         front_each(fst_graph_info, snd_graph_info)
         if for_each
         else front_all(fst_graph_info, snd_graph_info)
     )
-    is_changed = True
-    visited = dok_matrix(front.shape, dtype=bool)
-    next = visited.nnz
-    while is_changed:
-        for key, value in direct_sum.items():
-            if front is None:
-                new_front = visited.dot(value)
-            else:
-                new_front = front.dot(value)
-            visited += transform(new_front, len(snd_graph_info.all_states))
-        is_changed = visited.nnz != next
-        front = None
-        next = visited.nnz
-    return visited
-
-
-def ms_rpq(graph, regex, start_vertex=None, end_vertex=None, for_each=True):
-    graph_fst = create_ndfsm_by_graph(graph, start_vertex, end_vertex)
-    graph_snd = create_dfsm_by_regular_expression(regex)
-
-    graph_info = namedtuple(
-        "graph_info", "boolean_matrix all_states start_states final_states"
+    length = len(snd_graph_info.all_states)
+    shape = front.shape
+    # vertices visited by each row of the front, only the reached states are stored
+    front = sparse.csr_matrix(front, dtype=bool)[:, length:]
+    visited = sparse.csr_matrix(front.shape, dtype=bool)
+    backend = get_backend(
+        backend, list(fst_graph_info.boolean_matrix.values()) + [front]
     )
-
-    def get_graph_info(g):
-        """
-        Return information about all states of graph, start states and final
-        :param g: graph
-        """
-        boolean_matrix = get_boolean_matrix(g)
-        all_state = {state: idx for (idx, state) in enumerate(g.states)}
-        start_states = {State(state): state.value for state in g.start_states}
-        final_states = {State(state): state.value for state in g.final_states}
-        return graph_info(boolean_matrix, all_state, start_states, final_states)
-
-    first_graph_info = get_graph_info(graph_fst)
-    second_graph_info = get_graph_info(graph_snd)
-    result = BFS(first_graph_info, second_graph_info, for_each)
-
-    answer = set()
-
-    f_all_keys = list(first_graph_info.all_states.keys())
-    s_all_keys = list(second_graph_info.all_states.keys())
-    f_all_values = list(first_graph_info.all_states.values())
-    s_all_values = list(second_graph_info.all_states.values())
-
-    for i, j in zip(*result.nonzero()):
-        if j >= len(second_graph_info.all_states):
-            i_first = j - len(second_graph_info.all_states)
-            i_second = i % len(second_graph_info.all_states)
-            x = f_all_keys[f_all_values[i_first]]
-            y = s_all_keys[s_all_values[i_second]]
-            if (
-                x in first_graph_info.final_states.keys()
-                and y in second_graph_info.final_states.keys()
-            ):
-                answer.add(
-                    (State(i // len(second_graph_info.all_states)), State(i_first))
-                    if for_each
-                    else State(i_first)
+    # the moves between the states are block diagonal with a few entries in a row,
+    # so they stay sparse whatever the backend of the products by the graph is
+    moves = get_backend("sparse")
+    blocks = sparse.identity(shape[0] // length, dtype=bool)
+    steps = []
+    for symbol in fst_graph_info.boolean_matrix:
+        if symbol in snd_graph_info.boolean_matrix:
+            move = sparse.kron(
+                blocks, snd_graph_info.boolean_matrix[symbol].T, format="csr"
+            )
+            steps.append(
+                (
+                    str(symbol),
+                    move,
+                    backend.from_sparse(fst_graph_info.boolean_matrix[symbol]),
                 )
+            )
+
+    iteration = 0
+    while front.nnz:
+        iteration += 1
+        begin = time.perf_counter()
+        front_nnz = front.nnz
+        front = backend.from_sparse(front)
+        reached = moves.zeros(front.shape)
+        for name, move, matrix in steps:
+            step = multiply(backend, front, matrix, stats, "bfs", iteration, name)
+            reached = moves.add(
+                reached,
+                multiply(
+                    moves,
+                    move,
+                    backend.to_sparse(step),
+                    stats,
+                    "bfs",
+                    iteration,
+                    f"move {name}",
+                ),
+            )
+        front = reached > visited
+        visited = visited + front
+        if stats is not None:
+            stats.record(
+                "bfs",
+                "iteration",
+                iteration=iteration,
+                time=time.perf_counter() - begin,
+                front=front_nnz,
+                reached=reached.nnz,
+                added=front.nnz,
+                nnz=visited.nnz,
+                density=visited.nnz / max(1, visited.shape[0] * visited.shape[1]),
+            )
+    return get_normalized_front(*visited.nonzero(), shape, length)
+
+
+def get_normalized_front(rows, cols, shape, length):
+    """
+        Builds the front from the visited vertices of its rows,
+        every nonempty row gets its state on the main diagonal of the block
+
+    :param rows: rows of the vertices
+    :param cols: vertices
+    :param shape: shape of the front
+    :param length: count of states in the second graph
+    :return: csr_matrix front
+    """
+    diagonal = np.unique(rows)
+    return sparse.csr_matrix(
+        (
+            np.ones(len(diagonal) + len(rows), dtype=bool),
+            (
+                np.concatenate([diagonal, rows]),
+                np.concatenate([diagonal % length, cols + length]),
+            ),
+        ),
+        shape=shape,
+    )
 
-    return answer
+
+graph_info = namedtuple(
+    "graph_info", "boolean_matrix all_states start_states final_states"
+)
+
+
+def get_graph_info(g):
+    """
+    Return information about all states of graph, start states and final,
+    states are mapped to their indices in the boolean matrices
+    :param g: finite automaton
+    """
+    boolean_matrix = get_boolean_matrix(g)
+    all_state = get_states_index(g)
+    start_states = {state: all_state[state] for state in g.start_states}
+    final_states = {state: all_state[state] for state in g.final_states}
+    return graph_info(boolean_matrix, all_state, start_states, final_states)
+
+
+def get_graph_index_info(index, start_vertex=None, end_vertex=None):
+    """
+    Return information about the graph from its index,
+    vertices are mapped to their ids
+    :param index: GraphIndex
+    :param start_vertex: the vertices that are the starting values of the automaton
+    :param end_vertex: the vertices that are finite values of the automaton
+    """
+    start_states = {index.nodes[i]: i for i in index.get_ids(start_vertex)}
+    final_states = {index.nodes[i]: i for i in index.get_ids(end_vertex)}
+    return graph_info(index.matrices, index.vertices, start_states, final_states)
+
+
+def ms_rpq(
+    graph,
+    regex,
+    start_vertex=None,
+    end_vertex=None,
+    for_each=True,
+    chunk_size=None,
+    memory_budget=MS_RPQ_MEMORY_BUDGET,
+    backend="auto",
+    stats=None,
+):
+    """
+    Multiple-source regular path query by BFS over the direct sum of the graph and the automaton.
+    The answers of the chunks of start vertices are collected into one set,
+    so only the BFS of a chunk is bounded by the memory budget and the answer is not:
+    ms_rpq_stream yields the answer of every chunk and keeps nothing after it
+    :param graph: query graph (MultiDiGraph or GraphIndex)
+    :param regex: regular expression as a string or CompiledQuery
+    :param start_vertex: starting vertices of the graph
+    :param end_vertex: final vertices of the graph
+    :param for_each: return pairs of a start vertex and a reachable vertex (true)
+        or only vertices reachable from any start vertex (false)
+    :param chunk_size: number of start vertices processed at once if for_each
+    :param memory_budget: bytes for the visited states of a chunk, used if chunk_size is None,
+        see ms_rpq_stream
+    :param backend: backend of boolean matrix operations, see get_backend
+    :param stats: EngineStats of BFS, nothing is measured if None
+    :return: set of pairs of vertices or set of vertices
+    """
+    if for_each:
+        answer = set()
+        for pairs in ms_rpq_stream(
+            graph,
+            regex,
+            start_vertex,
+            end_vertex,
+            chunk_size,
+            memory_budget,
+            backend,
+            stats,
+        ):
+            answer |= pairs
+        return answer
+
+    index = get_graph_index(graph)
+    first_graph_info = get_graph_index_info(index, start_vertex, end_vertex)
+    second_graph_info = compile_query(regex).info
+    result = BFS(first_graph_info, second_graph_info, for_each, backend, stats)
+    return {
+        index.nodes[v]
+        for _, v in get_reached_pairs(result, first_graph_info, second_graph_info)
+    }
+
+
+def ms_rpq_stream(
+    graph,
+    regex,
+    start_vertex=None,
+    end_vertex=None,
+    chunk_size=None,
+    memory_budget=MS_RPQ_MEMORY_BUDGET,
+    backend="auto",
+    stats=None,
+):
+    """
+    Multiple-source regular path query for each start vertex,
+    the start vertices are processed in chunks and the answer of each chunk is yielded
+    as soon as it is found, so only one chunk is kept in memory
+    :param graph: query graph (MultiDiGraph or GraphIndex)
+    :param regex: regular expression as a string or CompiledQuery
+    :param start_vertex: starting vertices of the graph
+    :param end_vertex: final vertices of the graph
+    :param chunk_size: number of start vertices processed at once
+    :param memory_budget: bytes for the visited states of a chunk, used if chunk_size is None:
+        the visited states are sparse, VISITED_STATE_BYTES each, so the chunks after the first one
+        are sized by the states visited per start vertex. The front of a chunk is not counted:
+        the "auto" backend keeps it dense only within DENSE_MAX_BYTES, a bitset one takes
+        a bit for every state of the chunk
+    :param backend: backend of boolean matrix operations, see get_backend
+    :param stats: EngineStats of BFS, its records of all chunks are kept, nothing is measured if None
+    :return: generator of sets of pairs of a start vertex and a reachable vertex
+    """
+    index = get_graph_index(graph)
+    first_graph_info = get_graph_index_info(index, start_vertex, end_vertex)
+    second_graph_info = compile_query(regex).info
+    starts = list(first_graph_info.start_states.items())
+    size = MS_RPQ_FIRST_CHUNK_SIZE if chunk_size is None else max(1, chunk_size)
+    begin = 0
+    while begin < len(starts):
+        chunk = starts[begin : begin + size]
+        chunk_info = first_graph_info._replace(start_states=dict(chunk))
+        result = BFS(chunk_info, second_graph_info, True, backend, stats)
+        yield {
+            (index.nodes[chunk[block][1]], index.nodes[v])
+            for block, v in get_reached_pairs(result, chunk_info, second_graph_info)
+        }
+        begin += len(chunk)
+        if chunk_size is None:
+            # as many start vertices as fit the budget if they visit as many states
+            # as the start vertices of this chunk
+            per_start = max(1.0, result.nnz / len(chunk))
+            size = max(1, int(memory_budget / (VISITED_STATE_BYTES * per_start)))
+
+
+def get_reached_pairs(result, fst_info, snd_info):
+    """
+    Decodes the visited states of BFS into pairs of a block of the front
+    and a reached final vertex of the first graph
+    :param result: visited states returned by BFS
+    :param fst_info: info about first graph
+    :param snd_info: info about second graph
+    :return: zip of blocks and ids of vertices
+    """
+    length = len(snd_info.all_states)
+    rows, cols = result[:, length:].nonzero()
+    final_fst = np.zeros(len(fst_info.all_states), dtype=bool)
+    final_fst[list(fst_info.final_states.values())] = True
+    final_snd = np.zeros(length, dtype=bool)
+    final_snd[list(snd_info.final_states.values())] = True
+    keep = final_fst[cols] & final_snd[rows % length]
+    return zip((rows[keep] // length).tolist(), cols[keep].tolist())
@@ -0,0 +1,236 @@
+import numpy as np
+
+from project.graph_index import GraphIndex
+from project.graph_io import CHUNK_SIZE
+
+# random edges are drawn in blocks of this size, each from its own generator seeded by
+# the seed and the number of the block, so chunks of any size give the same edges
+RANDOM_BLOCK = 2**16
+
+
+class SyntheticGraph:
+    """
+    Labeled graph with vertices 0..n-1 whose edges are generated in chunks of arrays
+    of sources, targets and label indices, so that it is never built as a whole
+    unless requested. Random graphs depend only on the seed, not on the chunk size
+    """
+
+    def __init__(self, number_of_nodes, labels, get_chunks):
+        """
+        :param number_of_nodes: number of vertices
+        :param labels: names of the labels
+        :param get_chunks: function from the chunk size to a generator of chunks of edges
+        """
+        self.number_of_nodes = number_of_nodes
+        self.labels = list(labels)
+        self._get_chunks = get_chunks
+
+    def edges(self, chunk_size=CHUNK_SIZE):
+        """
+        Generator of arrays of sources, targets and label indices of at most chunk_size edges
+        """
+        return self._get_chunks(chunk_size)
+
+    def to_arrays(self, chunk_size=CHUNK_SIZE):
+        """
+        Arrays of sources, targets and label indices of all edges
+        """
+        chunks = list(self.edges(chunk_size))
+        empty = np.zeros(0, dtype=np.int64)
+        return tuple(
+            np.concatenate([chunk[i] for chunk in chunks] + [empty]) for i in range(3)
+        )
+
+    def to_index(self, chunk_size=CHUNK_SIZE) -> GraphIndex:
+        """
+        Index of the graph, parallel edges with the same label are merged
+        """
+        return GraphIndex().from_edges(
+            *self.to_arrays(chunk_size),
+            nodes=range(self.number_of_nodes),
+            label_names=self.labels,
+        )
+
+    def write_edges(self, path, chunk_size=CHUNK_SIZE):
+        """
+            Writes the edges as lines "from to label" read by read_edges and read_graph
+
+        :param path: edge list file
+        :param chunk_size: number of edges written at once
+        """
+        endings = [f" {label}\n" for label in self.labels]
+        with open(path, "w") as file:
+            for sources, targets, labels in self.edges(chunk_size):
+                file.write(
+                    "".join(
+                        f"{v} {u}{endings[label]}"
+                        for v, u, label in zip(
+                            sources.tolist(), targets.tolist(), labels.tolist()
+                        )
+                    )
+                )
+        return self
+
+    def save(self, directory, chunk_size=CHUNK_SIZE):
+        """
+        Stores the index of the graph by GraphIndex.save, it is loaded by GraphIndex.load
+        """
+        self.to_index(chunk_size).save(directory)
+        return self
+
+
+def _get_ranges(number_of_edges, chunk_size):
+    for begin in range(0, number_of_edges, chunk_size):
+        yield np.arange(begin, min(begin + chunk_size, number_of_edges), dtype=np.int64)
+
+
+def _draw_chunks(number_of_edges, chunk_size, seed, draw):
+    """
+        Chunks of random edges drawn block by block
+
+    :param number_of_edges: number of edges
+    :param chunk_size: maximum number of edges in a chunk
+    :param seed: seed of the graph
+    :param draw: function from the random generator and the number of edges to their arrays
+    :return: generator of chunks of at most chunk_size edges
+    """
+    blocks_per_chunk = max(1, chunk_size // RANDOM_BLOCK)
+    blocks = []
+    for block, i in enumerate(_get_ranges(number_of_edges, RANDOM_BLOCK)):
+        blocks.append(draw(np.random.default_rng((seed, block)), len(i)))
+        if len(blocks) == blocks_per_chunk or i[-1] == number_of_edges - 1:
+            arrays = [np.concatenate(array) for array in zip(*blocks)]
+            blocks = []
+            for begin in range(0, len(arrays[0]), chunk_size):
+                yield tuple(array[begin : begin + chunk_size] for array in arrays)
+
+
+def two_cycles_graph(fst_nodes_count, snd_nodes_count, labels=("a", "b")):
+    """
+        Two cycles with the common vertex 0 as in cfpq_data.labeled_two_cycles_graph:
+        0 -> 1 -> ... -> n -> 0 by the first label and
+        0 -> n + 1 -> ... -> n + m -> 0 by the second one
+
+    :param fst_nodes_count: number of vertices of the first cycle except the common one
+    :param snd_nodes_count: number of vertices of the second cycle except the common one
+    :param labels: labels of the first and the second cycle
+    :return: SyntheticGraph
+    """
+    n, m = fst_nodes_count, snd_nodes_count
+    number_of_nodes = n + m + 1
+
+    def get_chunks(chunk_size):
+        for i in _get_ranges(n + m + 2, chunk_size):
+            fst = i <= n
+            # the edges of the second cycle are numbered from 0 -> n + 1
+            j = i - n - 1
+            sources = np.where(fst, i, np.where(j == 0, 0, n + j))
+            targets = np.where(fst, (i + 1) % (n + 1), (n + j + 1) % number_of_nodes)
+            yield sources, targets, np.where(fst, 0, 1)
+
+    return SyntheticGraph(number_of_nodes, labels, get_chunks)
+
+
+def chain_graph(number_of_nodes, labels=("a",)):
+    """
+        Chain 0 -> 1 -> ... -> n - 1, the edge from i is labeled by labels[i % len(labels)]
+
+    :param number_of_nodes: number of vertices
+    :param labels: labels of the edges in turn
+    :return: SyntheticGraph
+    """
+
+    def get_chunks(chunk_size):
+        for i in _get_ranges(max(number_of_nodes - 1, 0), chunk_size):
+            yield i, i + 1, i % len(labels)
+
+    return SyntheticGraph(number_of_nodes, labels, get_chunks)
+
+
+def grid_graph(rows, columns, labels=("a", "b")):
+    """
+        Grid with the vertex r * columns + c in the row r and the column c:
+        the edges to the right are labeled by the first label, the edges down by the second
+
+    :param rows: number of rows
+    :param columns: number of columns
+    :param labels: labels of the edges to the right and down
+    :return: SyntheticGraph
+    """
+    right = rows * max(columns - 1, 0)
+
+    def get_chunks(chunk_size):
+        for i in _get_ranges(right + max(rows - 1, 0) * columns, chunk_size):
+            is_right = i < right
+            row, column = np.divmod(i, max(columns - 1, 1))
+            sources = np.where(is_right, row * columns + column, i - right)
+            targets = np.where(is_right, sources + 1, sources + columns)
+            yield sources, targets, np.where(is_right, 0, 1)
+
+    return SyntheticGraph(rows * columns, labels, get_chunks)
+
+
+def random_graph(number_of_nodes, number_of_edges, labels=("a", "b"), seed=0):
+    """
+        Graph with edges chosen uniformly at random: ends and labels are drawn independently
+
+    :param number_of_nodes: number of vertices
+    :param number_of_edges: number of generated edges, parallel ones included
+    :param labels: labels of the edges
+    :param seed: seed of the random generator
+    :return: SyntheticGraph
+    """
+
+    def draw(generator, size):
+        return (
+            generator.integers(0, number_of_nodes, size),
+            generator.integers(0, number_of_nodes, size),
+            generator.integers(0, len(labels), size),
+        )
+
+    return SyntheticGraph(
+        number_of_nodes,
+        labels,
+        lambda chunk_size: _draw_chunks(number_of_edges, chunk_size, seed, draw),
+    )
+
+
+def scale_free_graph(
+    number_of_nodes, number_of_edges, labels=("a", "b"), exponent=2.5, seed=0
+):
+    """
+        Chung-Lu graph with the power-law degree distribution: the ends of every edge
+        are drawn with probabilities proportional to the weights (i + 1) ** (-1 / (exponent - 1)),
+        so vertices with small ids are the hubs
+
+    :param number_of_nodes: number of vertices
+    :param number_of_edges: number of generated edges, parallel ones included
+    :param labels: labels of the edges
+    :param exponent: exponent of the degree distribution, greater than 1
+    :param seed: seed of the random generator
+    :return: SyntheticGraph
+    """
+    if exponent <= 1:
+        raise ValueError("The exponent of a scale-free graph must be greater than 1")
+
+    weights = np.arange(1, number_of_nodes + 1, dtype=np.float64) ** (
+        -1 / (exponent - 1)
+    )
+    bounds = np.cumsum(weights)
+    bounds /= bounds[-1]
+
+    def draw(generator, size):
+        points = generator.random(2 * size)
+        # sorted points are searched with far fewer cache misses
+        order = np.argsort(points)
+        ends = np.empty_like(order)
+        ends[order] = np.searchsorted(bounds, points[order], side="right")
+        # rounding of the last bound may let an end past the last vertex
+        ends = np.minimum(ends, number_of_nodes - 1)
+        return ends[0::2], ends[1::2], generator.integers(0, len(labels), size)
+
+    return SyntheticGraph(
+        number_of_nodes,
+        labels,
+        lambda chunk_size: _draw_chunks(number_of_edges, chunk_size, seed, draw),
+    )
@@ -0,0 +1,248 @@
+import os
+import pickle
+
+import numpy as np
+from networkx import MultiDiGraph
+from scipy import sparse
+
+from project.matrix_manager import get_boolean_matrices_by_edges
+
+
+class GraphIndex:
+    """
+    Edge-labeled graph with vertices interned into integer ids
+    and a boolean adjacency matrix in CSR format for each label
+    """
+
+    def __init__(self):
+        # vertex names in the order of their ids
+        self.nodes = []
+        # vertex name to its id, built on the first request
+        self._vertices = None
+        # label to the CSR adjacency matrix
+        self.matrices = dict()
+        # label to the number of edges
+        self.label_statistics = dict()
+        self._csc = dict()
+
+    def from_graph(self, graph: MultiDiGraph):
+        """
+        Builds the index from the graph with labels in the "label" edge attribute
+        """
+        nodes = list(graph.nodes)
+        vertices = {node: i for (i, node) in enumerate(nodes)}
+        edges = [
+            (vertices[v], vertices[u], label)
+            for v, u, label in graph.edges(data="label")
+            if label is not None
+        ]
+        sources, targets, labels = zip(*edges) if edges else ((), (), ())
+        return self.from_edges(sources, targets, labels, nodes)
+
+    def from_edges(self, sources, targets, labels, nodes=None, label_names=None):
+        """
+        Builds the index from edge arrays in one bulk pass
+
+        :param sources: array of source vertex ids
+        :param targets: array of target vertex ids
+        :param labels: array of edge labels
+        :param nodes: vertex names in the order of their ids, the ids themselves if None
+        :param label_names: names of the labels if labels are given by their indices in it
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if nodes is None:
+            number_of_nodes = (
+                int(max(sources.max(), targets.max())) + 1 if len(sources) else 0
+            )
+            nodes = range(number_of_nodes)
+        self.nodes = nodes if isinstance(nodes, range) else list(nodes)
+        self._vertices = None
+        self.matrices = get_boolean_matrices_by_edges(
+            sources, targets, labels, len(self.nodes)
+        )
+        if label_names is not None:
+            self.matrices = {
+                label_names[label]: matrix for label, matrix in self.matrices.items()
+            }
+        self.label_statistics = {
+            label: matrix.nnz for label, matrix in self.matrices.items()
+        }
+        self._csc = dict()
+        return self
+
+    @property
+    def vertices(self):
+        """
+        Dictionary from vertex name to its id
+        """
+        if self._vertices is None:
+            nodes = self.nodes
+            if isinstance(nodes, np.ndarray):
+                n = len(nodes)
+                nodes = (
+                    range(n)
+                    if n == 0
+                    or (nodes[0] == 0 and nodes[-1] == n - 1 and _increasing(nodes))
+                    else nodes.tolist()
+                )
+            # names of range(n) coincide with ids, so the range itself maps names to ids
+            self._vertices = (
+                nodes
+                if nodes == range(len(nodes))
+                else {node: i for (i, node) in enumerate(nodes)}
+            )
+        return self._vertices
+
+    @property
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def number_of_edges(self):
+        return sum(self.label_statistics.values())
+
+    @property
+    def labels(self):
+        return list(self.matrices.keys())
+
+    def csc(self, label):
+        """
+        Adjacency matrix of the label in CSC format, built on the first request
+        """
+        if label not in self._csc:
+            self._csc[label] = self.matrices[label].tocsc()
+        return self._csc[label]
+
+    def get_ids(self, vertices=None):
+        """
+        Ids of the given vertices, vertices that are not in the graph are skipped
+
+        :param vertices: vertex names, all vertices if None
+        :return: sorted array of ids
+        """
+        if vertices is None:
+            return np.arange(len(self.nodes))
+        return np.array(
+            sorted({self.vertices[v] for v in vertices if v in self.vertices}),
+            dtype=np.int64,
+        )
+
+    def get_mask(self, vertices=None):
+        """
+        Boolean mask over ids of the given vertices, all vertices if None
+        """
+        mask = np.zeros(len(self.nodes), dtype=bool)
+        mask[self.get_ids(vertices)] = True
+        return mask
+
+    def nbytes(self):
+        """
+        Memory used by the adjacency matrices in bytes
+        """
+        return sum(
+            m.data.nbytes + m.indices.nbytes + m.indptr.nbytes
+            for m in list(self.matrices.values()) + list(self._csc.values())
+        )
+
+    def save(self, directory):
+        """
+            Stores the index as .npy arrays of the adjacency matrices
+            and of the integer vertex names, so that they can be memory-mapped by load
+
+        :param directory: directory of the stored index, created if missing
+        """
+        os.makedirs(directory, exist_ok=True)
+        nodes_path = os.path.join(directory, "nodes.npy")
+        nodes = _integer_array(self.nodes)
+        if nodes is not None:
+            np.save(nodes_path, nodes)
+        elif os.path.exists(nodes_path):
+            os.remove(nodes_path)
+        for i, matrix in enumerate(self.matrices.values()):
+            for name in ("data", "indices", "indptr"):
+                np.save(
+                    os.path.join(directory, f"label_{i}_{name}.npy"),
+                    getattr(matrix, name),
+                )
+        with open(os.path.join(directory, "index.pickle"), "wb") as file:
+            pickle.dump(
+                (None if nodes is not None else self.nodes, self.labels),
+                file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        return self
+
+    def load(self, directory, mmap_mode="r"):
+        """
+            Loads the index stored by save
+
+        :param directory: directory of the stored index
+        :param mmap_mode: mode of memory-mapping of the arrays, None to read them into memory
+        """
+        with open(os.path.join(directory, "index.pickle"), "rb") as file:
+            nodes, labels = pickle.load(file)
+        if nodes is None:
+            nodes = np.load(os.path.join(directory, "nodes.npy"), mmap_mode=mmap_mode)
+        self.nodes = nodes
+        self._vertices = None
+        n = len(nodes)
+        self.matrices = dict()
+        for i, label in enumerate(labels):
+            data, indices, indptr = (
+                np.load(
+                    os.path.join(directory, f"label_{i}_{name}.npy"),
+                    mmap_mode=mmap_mode,
+                )
+                for name in ("data", "indices", "indptr")
+            )
+            self.matrices[label] = sparse.csr_matrix(
+                (data, indices, indptr), shape=(n, n), copy=False
+            )
+        self.label_statistics = {
+            label: matrix.nnz for label, matrix in self.matrices.items()
+        }
+        self._csc = dict()
+        return self
+
+
+def _integer_array(nodes):
+    """
+    Vertex names as an int64 array if all of them are integers, None otherwise
+    """
+    if isinstance(nodes, np.ndarray):
+        return nodes if np.issubdtype(nodes.dtype, np.integer) else None
+    if isinstance(nodes, range):
+        return np.arange(len(nodes), dtype=np.int64)
+    if not all(
+        isinstance(node, (int, np.integer)) and not isinstance(node, bool)
+        for node in nodes
+    ):
+        return None
+    try:
+        return np.array(nodes, dtype=np.int64)
+    except OverflowError:
+        return None
+
+
+def _increasing(array):
+    """
+    Whether the array is strictly increasing, checked by blocks to bound the temporary memory
+    """
+    block = 1 << 20
+    return all(
+        (np.diff(array[begin : begin + block + 1]) > 0).all()
+        for begin in range(0, len(array), block)
+    )
+
+
+def get_graph_index(graph) -> GraphIndex:
+    """
+        Returns the index of the graph, building it if a graph is given
+
+    :param graph: MultiDiGraph or already built GraphIndex
+    :return: GraphIndex
+    """
+    if isinstance(graph, GraphIndex):
+        return graph
+    return GraphIndex().from_graph(graph)
@@ -0,0 +1,450 @@
+import os
+import pathlib
+import re
+
+import numpy as np
+import pandas as pd
+
+from project.graph_index import GraphIndex, get_graph_index
+
+# number of edges read from a graph file at once
+CHUNK_SIZE = 2**20
+# integer vertex names are kept sorted rather than marked in a mask of their range
+# once the range is this many times larger than the number of names
+SPARSE_NAMES_FACTOR = 16
+
+
+def read_edges(path, chunk_size=CHUNK_SIZE):
+    """
+        Reads the edges of the graph in chunks
+
+    :param path: csv file of lines "from to label" or a directory of MatrixMarket files
+    :param chunk_size: number of edges read at once
+    :return: generator of arrays of sources, targets and labels
+    """
+    path = pathlib.Path(path)
+    if path.is_dir():
+        for mtx_file in sorted(path.glob("*.mtx")):
+            with open(mtx_file, "r") as file:
+                # comments and the line with the size of the matrix
+                line = file.readline()
+                while line.startswith("%") or not line.strip():
+                    line = file.readline()
+                for chunk in pd.read_csv(
+                    file,
+                    sep=" ",
+                    header=None,
+                    names=["from", "to"],
+                    engine="c",
+                    chunksize=chunk_size,
+                ):
+                    yield (
+                        chunk["from"].to_numpy(),
+                        chunk["to"].to_numpy(),
+                        np.full(len(chunk), mtx_file.stem, dtype=object),
+                    )
+        return
+    for chunk in pd.read_csv(
+        path,
+        sep=" ",
+        header=None,
+        names=["from", "to", "label"],
+        engine="c",
+        chunksize=chunk_size,
+    ):
+        yield (
+            chunk["from"].to_numpy(),
+            chunk["to"].to_numpy(),
+            chunk["label"].to_numpy(),
+        )
+
+
+def _intern(values, table):
+    """
+        Maps the values to their ids in the table, new values get the next ids
+
+    :param values: array of values
+    :param table: dictionary from value to id, updated in place
+    :return: array of ids
+    """
+    codes, uniques = pd.factorize(values)
+    ids = np.fromiter(
+        (table.setdefault(value, len(table)) for value in uniques.tolist()),
+        dtype=np.int64,
+        count=len(uniques),
+    )
+    return ids[codes]
+
+
+class _VertexIds:
+    """
+    Interns vertex names into ids: nonnegative integer names are only marked in a mask
+    and get ids in increasing order at the end, so no dictionary is built for them;
+    names spread over a range much wider than their number are kept as a sorted array instead.
+    After the first other name all names are strings and the new ones get ids
+    in the order of their first appearance
+    """
+
+    def __init__(self):
+        self.present = np.zeros(0, dtype=bool)
+        # sorted integer names, None while they are marked in the mask
+        self.sorted = None
+        # ids of the integer names, built on the first request
+        self._lookup = None
+        # number of integer names met with repetitions, a bound of the number of vertices
+        self.seen = 0
+        # vertex name to its id, None while all names are nonnegative integers
+        self.table = None
+
+    def add(self, sources, targets):
+        """
+            Registers the vertices of the edges
+
+        :return: keys of the sources and targets to be converted by lookup
+        """
+        if self.table is None:
+            names = np.concatenate([sources, targets])
+            if names.dtype.kind in "iu" and (len(names) == 0 or names.min() >= 0):
+                self._add_integers(names)
+                return sources, targets
+            names = self.get_integer_names()
+            self.table = {str(name): i for (i, name) in enumerate(names.tolist())}
+        # as in a file read at once, names are strings if some of them are not integers
+        ids = _intern(
+            np.column_stack([sources, targets]).ravel().astype(str), self.table
+        )
+        return ids[0::2], ids[1::2]
+
+    def _add_integers(self, names):
+        self.seen += len(names)
+        self._lookup = None
+        if len(names) == 0:
+            return
+        size = int(names.max()) + 1
+        if self.sorted is None and size > SPARSE_NAMES_FACTOR * self.seen:
+            self.sorted = np.flatnonzero(self.present)
+            self.present = None
+        if self.sorted is not None:
+            names = np.concatenate([self.sorted, names])
+            names.sort()
+            self.sorted = names[np.concatenate([[True], names[1:] != names[:-1]])]
+            return
+        if size > len(self.present):
+            self.present = np.pad(self.present, (0, size - len(self.present)))
+        self.present[names] = True
+
+    def get_integer_names(self):
+        """
+        Sorted array of the integer names
+        """
+        if self.sorted is not None:
+            return self.sorted
+        return np.flatnonzero(self.present)
+
+    def __len__(self):
+        if self.table is not None:
+            return len(self.table)
+        if self.sorted is not None:
+            return len(self.sorted)
+        return int(self.present.sum())
+
+    def lookup(self, names):
+        """
+        Ids of the integer names, the names met before the first other name
+        keep these ids after it
+        """
+        if self.sorted is not None:
+            if self._lookup is None:
+                self._lookup = pd.Index(self.sorted)
+            return self._lookup.get_indexer(names)
+        if self._lookup is None:
+            self._lookup = np.cumsum(self.present) - 1
+        return self._lookup[names]
+
+    @property
+    def nodes(self):
+        if self.table is not None:
+            return list(self.table)
+        names = self.get_integer_names()
+        if len(names) == 0 or names[-1] == len(names) - 1:
+            return range(len(names))
+        return names.tolist()
+
+
+def get_graph_index_from_file(path, chunk_size=CHUNK_SIZE) -> GraphIndex:
+    """
+        Builds the index of the graph from its file without building the graph
+
+    :param path: csv file of lines "from to label" or a directory of MatrixMarket files
+    :param chunk_size: number of edges read at once
+    :return: GraphIndex
+    """
+    vertices = _VertexIds()
+    labels = {}
+    all_sources, all_targets, all_labels = [], [], []
+    # number of chunks with integer names that are converted to ids at the end
+    integer_chunks = 0
+    for sources, targets, edge_labels in read_edges(path, chunk_size):
+        was_integer = vertices.table is None
+        sources, targets = vertices.add(sources, targets)
+        if was_integer and vertices.table is not None:
+            integer_chunks = len(all_sources)
+        elif vertices.table is None:
+            integer_chunks = len(all_sources) + 1
+        all_sources.append(sources)
+        all_targets.append(targets)
+        all_labels.append(_intern(edge_labels, labels))
+    for i in range(integer_chunks):
+        all_sources[i] = vertices.lookup(all_sources[i])
+        all_targets[i] = vertices.lookup(all_targets[i])
+    empty = [np.zeros(0, dtype=np.int64)]
+    return GraphIndex().from_edges(
+        np.concatenate(all_sources + empty),
+        np.concatenate(all_targets + empty),
+        np.concatenate(all_labels + empty),
+        vertices.nodes,
+        list(labels),
+    )
+
+
+def get_graph_information_from_file(path, chunk_size=CHUNK_SIZE):
+    """
+        Return information about graph from its file: count vertex, count edges, all labels,
+        only the set of vertices and the numbers of uses of labels are kept in memory
+
+    :param path: csv file of lines "from to label" or a directory of MatrixMarket files
+    :param chunk_size: number of edges read at once
+    :return: count vertex, count edges, all labels sorted by the number of uses
+    """
+    vertices = _VertexIds()
+    labels = {}
+    uses = np.zeros(0, dtype=np.int64)
+    number_of_edges = 0
+    for sources, targets, edge_labels in read_edges(path, chunk_size):
+        vertices.add(sources, targets)
+        codes = _intern(edge_labels, labels)
+        uses = np.pad(uses, (0, len(labels) - len(uses)))
+        uses += np.bincount(codes, minlength=len(labels))
+        number_of_edges += len(codes)
+    # the labels with equal number of uses are sorted lexicographically
+    sorted_labels = sorted(zip(labels, uses.tolist()), key=lambda x: (-x[1], x[0]))
+    return len(vertices), number_of_edges, [label for label, _ in sorted_labels]
+
+
+# identifier of the DOT language: a quoted string, a numeral or a name
+_ID = r'"(?:[^"\\]|\\.)*"|-?\.?[\w.]+'
+# one statement of the supported subset: a node "v [attributes];"
+# or an edge "v -> u [attributes];" on its own line
+_STATEMENT = re.compile(rf"\s*({_ID})\s*(?:->\s*({_ID})\s*)?(?:\[([^\]]*)\])?\s*;?\s*$")
+_LABEL = re.compile(rf"(?:^|[\s,;])label\s*=\s*({_ID})")
+_NUMBER = re.compile(r"-?\d+$")
+_NAME = re.compile(r"[A-Za-z_][\w]*$|-?\d+$")
+# lines of the graph that are not node or edge statements
+_SKIPPED = re.compile(
+    r"\s*(?:$|//|#|/\*|\*|}|(?:strict\s+)?(?:di)?graph\b|(?:graph|node|edge)\s*\[|\w+\s*=)",
+    re.IGNORECASE,
+)
+_KEYWORDS = {"graph", "digraph", "node", "edge", "strict", "subgraph"}
+# characters of a name that is quoted in the edge list
+_FIELD_QUOTED = re.compile(r'[\s"]')
+
+
+def _unquote(name):
+    if name.startswith('"'):
+        return name[1:-1].replace('\\"', '"')
+    return name
+
+
+def _get_node_name(name):
+    """
+    Name of the vertex in the file, numeric names become integers
+    """
+    name = _unquote(name)
+    return int(name) if _NUMBER.match(name) else name
+
+
+def _quote(name):
+    name = str(name)
+    if _NAME.match(name) and name.lower() not in _KEYWORDS:
+        return name
+    return '"' + name.replace('"', '\\"') + '"'
+
+
+def _quote_field(name):
+    """
+    Field of the edge list, quoted as in csv if it has spaces, quotes or line breaks
+    """
+    name = str(name)
+    if name and not _FIELD_QUOTED.search(name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+def read_dot(path, chunk_size=CHUNK_SIZE) -> GraphIndex:
+    """
+        Reads the graph in DOT format line by line straight into its index,
+        without building the graph. Supported are the statements of nodes and of single
+        edges "v -> u [label=a];" placed on separate lines, as they are written by write_dot
+        and pydot; edges without a label are skipped as in GraphIndex.from_graph
+
+    :param path: DOT file
+    :param chunk_size: number of edges collected before they are converted to arrays
+    :return: GraphIndex with vertices in the order of their first appearance
+    """
+    vertices = {}
+    labels = {}
+    # ids of the vertices and labels by their text in the file, so that every name is parsed once
+    tokens = {}
+    attribute_labels = {}
+    all_sources, all_targets, all_labels = [], [], []
+    sources, targets, edge_labels = [], [], []
+    with open(path, "r") as file:
+        for line in file:
+            statement = _STATEMENT.match(line)
+            if statement is None:
+                if _SKIPPED.match(line):
+                    continue
+                raise ValueError(f"Unsupported DOT statement: {line.strip()}")
+            v, u, attributes = statement.groups()
+            if v not in tokens:
+                if u is None and v.lower() in _KEYWORDS:
+                    # attributes of the graph, nodes or edges
+                    continue
+                tokens[v] = vertices.setdefault(_get_node_name(v), len(vertices))
+            if u is None:
+                continue
+            if u not in tokens:
+                tokens[u] = vertices.setdefault(_get_node_name(u), len(vertices))
+            if attributes not in attribute_labels:
+                label = _LABEL.search(attributes) if attributes else None
+                attribute_labels[attributes] = (
+                    None
+                    if label is None
+                    else labels.setdefault(_unquote(label.group(1)), len(labels))
+                )
+            label = attribute_labels[attributes]
+            if label is None:
+                continue
+            sources.append(tokens[v])
+            targets.append(tokens[u])
+            edge_labels.append(label)
+            if len(sources) == chunk_size:
+                all_sources.append(np.array(sources, dtype=np.int64))
+                all_targets.append(np.array(targets, dtype=np.int64))
+                all_labels.append(np.array(edge_labels, dtype=np.int64))
+                sources, targets, edge_labels = [], [], []
+    all_sources.append(np.array(sources, dtype=np.int64))
+    all_targets.append(np.array(targets, dtype=np.int64))
+    all_labels.append(np.array(edge_labels, dtype=np.int64))
+    return GraphIndex().from_edges(
+        np.concatenate(all_sources),
+        np.concatenate(all_targets),
+        np.concatenate(all_labels),
+        list(vertices),
+        list(labels),
+    )
+
+
+def _get_edges(graph):
+    """
+    Chunks of edges of the graph as lists of source and target names, labels and keys
+    """
+    if isinstance(graph, GraphIndex):
+        for label, matrix in graph.matrices.items():
+            rows, cols = matrix.nonzero()
+            for begin in range(0, len(rows), CHUNK_SIZE):
+                yield (
+                    [graph.nodes[v] for v in rows[begin : begin + CHUNK_SIZE].tolist()],
+                    [graph.nodes[u] for u in cols[begin : begin + CHUNK_SIZE].tolist()],
+                    [label] * len(rows[begin : begin + CHUNK_SIZE]),
+                    None,
+                )
+        return
+    edges = [
+        (v, u, key, label)
+        for v, u, key, label in graph.edges(keys=True, data="label")
+        if label is not None
+    ]
+    if edges:
+        sources, targets, keys, edge_labels = zip(*edges)
+        yield sources, targets, edge_labels, keys
+
+
+def write_dot(graph, path):
+    """
+        Writes the graph in DOT format in the layout of pydot,
+        the lines are formatted in bulk and written in chunks
+
+    :param graph: MultiDiGraph with labels in the "label" edge attribute or GraphIndex
+    :param path: DOT file
+    """
+    with open(path, "w") as file:
+        file.write("digraph  {\n")
+        # the names are quoted once for all their edges
+        quoted = {v: _quote(v) for v in graph.nodes}
+        names = list(quoted.values())
+        for begin in range(0, len(names), CHUNK_SIZE):
+            file.write("".join(f"{v};\n" for v in names[begin : begin + CHUNK_SIZE]))
+        for sources, targets, edge_labels, keys in _get_edges(graph):
+            quoted_labels = {label: _quote(label) for label in set(edge_labels)}
+            if keys is None:
+                lines = (
+                    f"{quoted[v]} -> {quoted[u]}  [label={quoted_labels[label]}];\n"
+                    for v, u, label in zip(sources, targets, edge_labels)
+                )
+            else:
+                lines = (
+                    f"{quoted[v]} -> {quoted[u]}  [key={key}, label={quoted_labels[label]}];\n"
+                    for v, u, label, key in zip(sources, targets, edge_labels, keys)
+                )
+            file.write("".join(lines))
+        file.write("}\n")
+
+
+def write_edges(graph, path):
+    """
+        Writes the edges of the graph as lines "from to label" read by read_edges,
+        names with spaces, quotes or line breaks are quoted as in csv
+
+    :param graph: MultiDiGraph with labels in the "label" edge attribute or GraphIndex
+    :param path: edge list file
+    """
+    with open(path, "w") as file:
+        # the names are quoted once for all their edges
+        quoted = {v: _quote_field(v) for v in graph.nodes}
+        for sources, targets, edge_labels, _ in _get_edges(graph):
+            quoted_labels = {label: _quote_field(label) for label in set(edge_labels)}
+            file.write(
+                "".join(
+                    f"{quoted[v]} {quoted[u]} {quoted_labels[label]}\n"
+                    for v, u, label in zip(sources, targets, edge_labels)
+                )
+            )
+
+
+def read_graph(path, chunk_size=CHUNK_SIZE) -> GraphIndex:
+    """
+        Reads the graph file into its index by the format of the file:
+        DOT for .dot and .gv files, edges "from to label" for the other files
+        and MatrixMarket files of the labels for a directory
+
+    :param path: graph file or directory
+    :param chunk_size: number of edges read at once
+    :return: GraphIndex
+    """
+    path = pathlib.Path(path)
+    if path.suffix.lower() in (".dot", ".gv"):
+        return read_dot(path, chunk_size)
+    return get_graph_index_from_file(path, chunk_size)
+
+
+def load_graph_index(graph) -> GraphIndex:
+    """
+        Returns the index of the graph, reading it by read_graph if a path is given
+
+    :param graph: path to the graph file, MultiDiGraph or GraphIndex
+    :return: GraphIndex
+    """
+    if isinstance(graph, (str, os.PathLike)):
+        return read_graph(graph)
+    return get_graph_index(graph)
@@ -1,22 +1,35 @@
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+import shutil
+import tempfile
 from typing import Tuple
 
 import cfpq_data
 import networkx
 
+from project.graph_index import GraphIndex
+from project.graph_io import (
+    CHUNK_SIZE,
+    get_graph_index_from_file,
+    get_graph_information_from_file,
+    read_edges,
+    write_dot,
+)
 
-def get_graf_information_by_name(name: str):
+
+def get_graf_information_by_name(name: str, chunk_size=CHUNK_SIZE):
     """
-        Return information about graph: count vertex, count edges, all labels
+        Return information about graph: count vertex, count edges, all labels,
+        the graph file is read in chunks without building the graph
 
     :param name: string which is the name of the graph
-    :return: count vertex, count edges, all labels
+    :param chunk_size: number of edges read at once
+    :return: count vertex, count edges, all labels sorted by the number of uses
     """
-    graph = get_graph_by_name(name)
-    return (
-        graph.number_of_nodes(),
-        graph.number_of_edges(),
-        cfpq_data.get_sorted_labels(graph),
-    )
+    return get_graph_information_from_file(get_graph_path(name), chunk_size)
 
 
 def get_graph_by_name(name: str):
@@ -26,7 +39,159 @@ def get_graph_by_name(name: str):
     :param name: string which is the name of the graph
     :return: download graph: nx.MultiDiGraph
     """
-    return cfpq_data.graph_from_csv(cfpq_data.download(name))
+    graph = networkx.MultiDiGraph()
+    for sources, targets, labels in read_edges(get_graph_path(name)):
+        graph.add_edges_from(
+            (v, u, {"label": label}) for v, u, label in zip(sources, targets, labels)
+        )
+    return graph
+
+
+def get_graph_index_by_name(
+    name: str, chunk_size=CHUNK_SIZE, use_cache=True
+) -> GraphIndex:
+    """
+        Download the graph and return its index,
+        the graph file is read in chunks straight into the matrices of the labels.
+        The index is cached next to the downloaded graph and memory-mapped on the next calls,
+        an already downloaded graph is not downloaded again if the cache is used
+
+    :param name: string which is the name of the graph
+    :param chunk_size: number of edges read at once
+    :param use_cache: load the index from the cache and store it there
+    :return: GraphIndex
+    """
+    path = None
+    if use_cache:
+        downloaded = pathlib.Path(cfpq_data.GRAPHS_DIR) / name
+        if downloaded.exists():
+            path = _get_graph_file(downloaded, name)
+    if path is None:
+        path = get_graph_path(name)
+    index = load_cached_index(path) if use_cache else None
+    if index is None:
+        index = get_graph_index_from_file(path, chunk_size)
+        if use_cache:
+            store_cached_index(path, index)
+    return index
+
+
+def get_graph_path(name: str) -> pathlib.Path:
+    """
+        Download the graph and return the path to its edges: a csv file
+        or a directory of MatrixMarket files with a file for each label
+
+    :param name: string which is the name of the graph
+    :return: path to the edges of the graph
+    """
+    return _get_graph_file(pathlib.Path(cfpq_data.download(name)), name)
+
+
+def _get_graph_file(path, name):
+    if path.is_file():
+        return path
+    if (path / "graph").exists():
+        return path / "graph"
+    csv_files = sorted(path.glob("*.csv"))
+    if not csv_files:
+        raise FileNotFoundError(f"No graph file of {name} in {path}")
+    return csv_files[0]
+
+
+def get_cache_path(path) -> pathlib.Path:
+    """
+    Directory of the cached index of the graph file, it is next to the file
+    """
+    path = pathlib.Path(path)
+    return path.parent / (path.name + ".index")
+
+
+def _get_files(path):
+    path = pathlib.Path(path)
+    return sorted(path.iterdir()) if path.is_dir() else [path]
+
+
+def get_stamp(path):
+    """
+        Sizes and modification times of the graph file, or of the files of the directory
+
+    :param path: graph file or directory
+    :return: list of names, sizes and modification times
+    """
+    return [
+        [file.name, file.stat().st_size, file.stat().st_mtime_ns]
+        for file in _get_files(path)
+    ]
+
+
+def get_checksum(path) -> str:
+    """
+        Checksum of the contents of the graph file, or of the files of the directory
+
+    :param path: graph file or directory
+    :return: hex digest
+    """
+    digest = hashlib.sha256()
+    for file in _get_files(path):
+        digest.update(file.name.encode("utf-8"))
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(2**20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def load_cached_index(path):
+    """
+        Memory-maps the cached index of the graph file if the file has not changed:
+        the file is only hashed again if its sizes or modification times differ
+        from the ones of the cached index
+
+    :param path: graph file or directory
+    :return: GraphIndex or None if there is no valid cached index
+    """
+    cache_path = get_cache_path(path)
+    try:
+        with open(cache_path / "checksum.json", "r") as file:
+            source = json.load(file)
+        stamp = get_stamp(path)
+        if source["stamp"] != stamp:
+            if source["checksum"] != get_checksum(path):
+                return None
+            source["stamp"] = stamp
+            _write_checksum(cache_path, source)
+        return GraphIndex().load(cache_path, mmap_mode="r")
+    except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def store_cached_index(path, index: GraphIndex):
+    """
+        Stores the index of the graph file next to it with the checksum of the file,
+        the cache is written into a temporary directory and renamed at once,
+        so processes storing the same index concurrently do not break it
+
+    :param path: graph file or directory
+    :param index: index of the graph
+    """
+    cache_path = get_cache_path(path)
+    source = {"stamp": get_stamp(path), "checksum": get_checksum(path)}
+    temporary = pathlib.Path(
+        tempfile.mkdtemp(dir=cache_path.parent, prefix=cache_path.name)
+    )
+    try:
+        index.save(temporary)
+        _write_checksum(temporary, source)
+        if cache_path.exists():
+            shutil.rmtree(cache_path, ignore_errors=True)
+        os.replace(temporary, cache_path)
+    except OSError:
+        # the cache has been stored by another process
+        shutil.rmtree(temporary, ignore_errors=True)
+
+
+def _write_checksum(cache_path, source):
+    with open(cache_path / "checksum.json", "w") as file:
+        json.dump(source, file)
 
 
 def create_graph_by_number_vertices_in_loops_and_label_names_and_save_in_file(
@@ -45,5 +210,4 @@ def create_graph_by_number_vertices_in_loops_and_label_names_and_save_in_file(
     graph = cfpq_data.labeled_two_cycles_graph(
         fst_nodes_count, snd_nodes_count, labels=labels
     )
-    pydot_graph = networkx.drawing.nx_pydot.to_pydot(graph)
-    pydot_graph.write(file_name)
+    write_dot(graph, file_name)
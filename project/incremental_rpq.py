@@ -0,0 +1,259 @@
+import numpy as np
+from scipy import sparse
+
+from project.finite_state_machine_manager import (
+    compile_query,
+    get_answer_matrix,
+    iterate_pairs,
+)
+from project.graph_index import GraphIndex, get_graph_index
+from project.matrix_manager import transitive_closure, update_transitive_closure
+
+# deletions affecting a larger share of the states of the intersection recompute the whole closure
+RECOMPUTE_SHARE = 0.5
+
+
+def _pad(matrix, size):
+    """
+    Extends the square csr matrix with empty rows and columns up to the size
+    """
+    extra = size - matrix.shape[0]
+    if extra == 0:
+        return matrix
+    indptr = np.concatenate([matrix.indptr, np.full(extra, matrix.indptr[-1])])
+    return sparse.csr_matrix(
+        (matrix.data, matrix.indices, indptr), shape=(size, size), dtype=matrix.dtype
+    )
+
+
+class MaintainedQuery:
+    """
+    Regular path query registered against a changing graph: the transitive closure
+    of the intersection of the graph and the automaton of the query is updated
+    on edge additions and deletions, and the answer is served from it without recomputation.
+    Parallel edges are counted, so an edge disappears from the matrices
+    only when its last copy is removed
+    """
+
+    def __init__(
+        self, graph, regex, start_vertex=None, end_vertex=None, backend="auto"
+    ):
+        """
+        :param graph: query graph (MultiDiGraph or GraphIndex),
+            the index has no parallel edges, so every its edge is counted once
+        :param regex: regular expression as a string or CompiledQuery
+        :param start_vertex: starting vertices of the graph, all vertices if None
+        :param end_vertex: final vertices of the graph, all vertices if None
+        :param backend: backend of boolean matrix operations of the closure, see get_backend
+        """
+        index = get_graph_index(graph)
+        self.query = compile_query(regex)
+        self.start_vertex = start_vertex
+        self.end_vertex = end_vertex
+        self.backend = backend
+        self.nodes = list(index.nodes)
+        self.vertices = {node: i for (i, node) in enumerate(self.nodes)}
+        # label to the csr adjacency matrix, matrices are replaced rather than modified
+        self.matrices = dict(index.matrices)
+        # label to the int csr matrix of the numbers of parallel edges
+        self.edge_counts = (
+            {label: m.astype(np.int32) for label, m in index.matrices.items()}
+            if isinstance(graph, GraphIndex)
+            else self._get_label_matrices(
+                (v, u, label)
+                for v, u, label in graph.edges(data="label")
+                if label is not None
+            )
+        )
+        # numbers of the labels giving every transition of the intersection
+        self.intersection_counts = self.get_intersection()
+        self.intersection = self.intersection_counts.astype(bool)
+        self.closure = transitive_closure(self.intersection, backend=backend)
+        self._update_answer()
+
+    @property
+    def size(self):
+        """
+        Number of states of the intersection
+        """
+        return len(self.nodes) * self.query.number_of_states
+
+    @property
+    def answer(self):
+        """
+        Pairs of start and end vertices connected by a path from the language of the query
+        """
+        if self._answer is None:
+            self._answer = list(iterate_pairs(self.result, self.nodes))
+        return self._answer
+
+    def get_intersection(self):
+        """
+        Intersection of the current graph with the automaton of the query
+        as the int matrix of the numbers of labels giving every transition
+        """
+        matrix = sparse.csr_matrix((self.size, self.size), dtype=np.int32)
+        for label, m in self.matrices.items():
+            if label in self.query.matrices:
+                matrix = matrix + self._get_product(m, label)
+        return matrix
+
+    def _get_product(self, matrix, label):
+        """
+        Transitions of the intersection given by the edges of the matrix with the label
+        """
+        return sparse.kron(matrix, self.query.matrices[label], format="csr").astype(
+            np.int32
+        )
+
+    def add_edges(self, edges):
+        """
+            Adds edges to the graph and extends the closure only by the pairs
+            that appear because of them, new vertices are added to the graph
+
+        :param edges: triples (v, u, label)
+        """
+        edges = list(edges)
+        for v, u, _ in edges:
+            for node in (v, u):
+                if node not in self.vertices:
+                    self.vertices[node] = len(self.nodes)
+                    self.nodes.append(node)
+        self._resize()
+        delta = sparse.csr_matrix((self.size, self.size), dtype=np.int32)
+        for label, counts in self._get_label_matrices(edges).items():
+            if label not in self.matrices:
+                self.matrices[label] = sparse.csr_matrix(counts.shape, dtype=bool)
+                self.edge_counts[label] = sparse.csr_matrix(
+                    counts.shape, dtype=np.int32
+                )
+            # only the edges without parallel copies change the intersection
+            new = counts.astype(bool) > self.matrices[label]
+            self.edge_counts[label] = self.edge_counts[label] + counts
+            self.matrices[label] = self.matrices[label] + new
+            if label in self.query.matrices:
+                delta = delta + self._get_product(new, label)
+        self.intersection_counts = self.intersection_counts + delta
+        delta = delta.astype(bool)
+        self.intersection = self.intersection + delta
+        self.closure = update_transitive_closure(self.closure, delta, self.backend)
+        self._update_answer()
+        return self
+
+    def remove_edges(self, edges):
+        """
+            Removes edges from the graph and recomputes only the rows of the closure
+            of the states that reached a removed transition, or the whole closure
+            if they are more than RECOMPUTE_SHARE of all states.
+            An edge with parallel copies stays in the graph until its last copy is removed
+
+        :param edges: triples (v, u, label), edges with unknown vertices are skipped
+        """
+        edges = [
+            (v, u, label)
+            for v, u, label in edges
+            if v in self.vertices and u in self.vertices
+        ]
+        removed = sparse.csr_matrix((self.size, self.size), dtype=np.int32)
+        for label, counts in self._get_label_matrices(edges).items():
+            if label not in self.matrices:
+                continue
+            counts = self.edge_counts[label] - counts
+            # removing more copies than the graph has removes all of them
+            counts.data = np.maximum(counts.data, 0)
+            counts.eliminate_zeros()
+            self.edge_counts[label] = counts
+            gone = self.matrices[label] > counts.astype(bool)
+            self.matrices[label] = self.matrices[label] > gone
+            if label in self.query.matrices:
+                removed = removed + self._get_product(gone, label)
+        # a transition given by several labels stays while one of them is left
+        self.intersection_counts = self.intersection_counts - removed
+        self.intersection_counts.eliminate_zeros()
+        intersection = self.intersection_counts.astype(bool)
+        lost = self.intersection > intersection
+        self.intersection = intersection
+        affected = np.zeros(self.size, dtype=bool)
+        if lost.nnz:
+            rows = np.flatnonzero(np.diff(lost.indptr))
+            affected[rows] = True
+            affected[self.closure[:, rows].nonzero()[0]] = True
+
+        if affected.sum() > RECOMPUTE_SHARE * self.size:
+            self.closure = transitive_closure(self.intersection, backend=self.backend)
+        elif affected.any():
+            self.closure = self._recompute_rows(np.flatnonzero(affected))
+        self._update_answer()
+        return self
+
+    def _recompute_rows(self, rows):
+        """
+            Recomputes the rows of the closure by BFS from them, the rows of the other states
+            are still valid and let BFS jump over the paths through them
+
+        :param rows: states of the intersection whose rows are recomputed
+        :return: updated closure
+        """
+        keep = np.ones(self.size, dtype=bool)
+        keep[rows] = False
+        kept = sparse.diags(keep, dtype=bool, format="csr") @ self.closure
+        step = self.intersection + kept
+        reached = self.intersection[rows]
+        front = reached
+        while front.nnz:
+            front = (front @ step) > reached
+            reached = reached + front
+        reached = reached.tocoo()
+        recomputed = sparse.csr_matrix(
+            (reached.data, (rows[reached.row], reached.col)),
+            shape=(self.size, self.size),
+            dtype=bool,
+        )
+        return kept + recomputed
+
+    def _get_label_matrices(self, edges):
+        """
+        Int matrices of the numbers of the edges by labels
+        """
+        by_label = {}
+        for v, u, label in edges:
+            rows, cols = by_label.setdefault(label, ([], []))
+            rows.append(self.vertices[v])
+            cols.append(self.vertices[u])
+        n = len(self.nodes)
+        return {
+            label: sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(n, n)
+            )
+            for label, (rows, cols) in by_label.items()
+        }
+
+    def _resize(self):
+        """
+        Extends the matrices by the added vertices, the states of the intersection
+        are numbered vertex by vertex, so the existing states keep their indices
+        """
+        n = len(self.nodes)
+        self.matrices = {label: _pad(m, n) for label, m in self.matrices.items()}
+        self.edge_counts = {label: _pad(m, n) for label, m in self.edge_counts.items()}
+        self.intersection = _pad(self.intersection, self.size)
+        self.intersection_counts = _pad(self.intersection_counts, self.size)
+        self.closure = _pad(sparse.csr_matrix(self.closure, dtype=bool), self.size)
+
+    def _get_ids(self, vertices):
+        if vertices is None:
+            return np.arange(len(self.nodes))
+        return np.array(
+            sorted({self.vertices[v] for v in vertices if v in self.vertices}),
+            dtype=np.int64,
+        )
+
+    def _update_answer(self):
+        self.result = get_answer_matrix(
+            self.closure,
+            None,
+            (self._get_ids(self.start_vertex), self.query.start_states),
+            (self._get_ids(self.end_vertex), self.query.final_states),
+            (len(self.nodes), self.query.number_of_states),
+        )
+        self._answer = None
@@ -1,5 +1,15 @@
+import time
+
+import numpy as np
 from pyformlang.finite_automaton import EpsilonNFA
 from scipy import sparse
+from scipy.sparse import csgraph
+
+from project.boolean_backend import get_backend
+from project.stats import multiply
+
+# the scc closure keeps a bitset over components for every component
+SCC_MAX_COMPONENTS = 8192
 
 
 def get_boolean_matrix(graph: EpsilonNFA):
@@ -9,12 +19,12 @@ def get_boolean_matrix(graph: EpsilonNFA):
     :param graph: EpsilonNFA for constructing a boolean matrix
     :return: a boolean matrix
     """
-    # answer
-    matrix = {}
+    # edges of each marker as lists of row and column indices
+    edges = {}
     # matrix dimensions for each marker
     len_states = len(graph.states)
     # to get the vertex index
-    all_state = {start: i for (i, start) in enumerate(graph.states)}
+    all_state = get_states_index(graph)
     # iterating over the vertices of the graph
     for start_state, labels in graph.to_dict().items():
         # iterate along the edges that emerge from the vertex
@@ -22,29 +32,267 @@ def get_boolean_matrix(graph: EpsilonNFA):
             # a crutch for iteration, as there is no guarantee that the graph is minimal
             if not isinstance(vertexes, set):
                 vertexes = {vertexes}
+            rows, cols = edges.setdefault(edge, ([], []))
             for v in vertexes:
-                # if an edge with this label has never been added, then add it to the response with the matrix
-                if not edge in matrix:
-                    matrix[edge] = sparse.dok_matrix(
-                        (len_states, len_states), dtype=bool
-                    )
-                matrix[edge][all_state[start_state], all_state[v]] = True
-    return matrix
+                rows.append(all_state[start_state])
+                cols.append(all_state[v])
+    # every matrix is built at once instead of entry by entry
+    return {
+        edge: sparse.csr_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, cols)),
+            shape=(len_states, len_states),
+        )
+        for edge, (rows, cols) in edges.items()
+    }
+
+
+def get_boolean_matrices_by_edges(sources, targets, labels, number_of_nodes):
+    """
+    Constructs a Boolean matrix for each label from edge arrays in one bulk pass,
+    without building an automaton over the graph
+
+    :param sources: array of source vertex ids
+    :param targets: array of target vertex ids
+    :param labels: array of edge labels
+    :param number_of_nodes: number of vertices
+    :return: dictionary from label to its boolean csr matrix
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    label_values, label_ids = np.unique(np.asarray(labels), return_inverse=True)
+    label_ids = label_ids.reshape(-1).astype(np.int64)
+    # edges sorted by label, then by source and target, become csr rows directly
+    n = max(number_of_nodes, 1)
+    if len(label_values) * n * n < 2**63:
+        # sorting one packed key is much faster than lexsort of three arrays
+        keys = np.sort((label_ids * n + sources) * n + targets)
+        keys = keys[np.concatenate((keys[:1] == keys[:1], keys[1:] != keys[:-1]))]
+        label_ids, rest = np.divmod(keys, n * n)
+        sources, targets = np.divmod(rest, n)
+    else:
+        order = np.lexsort((targets, sources, label_ids))
+        sources, targets = sources[order], targets[order]
+        label_ids = label_ids[order]
+        unique = np.ones(len(order), dtype=bool)
+        unique[1:] = (
+            (sources[1:] != sources[:-1])
+            | (targets[1:] != targets[:-1])
+            | (label_ids[1:] != label_ids[:-1])
+        )
+        sources, targets = sources[unique], targets[unique]
+        label_ids = label_ids[unique]
+    bounds = np.searchsorted(label_ids, np.arange(len(label_values) + 1))
+    index_dtype = np.int32 if number_of_nodes < 2**31 else np.int64
 
+    matrices = {}
+    for i, label in enumerate(label_values):
+        begin, end = bounds[i], bounds[i + 1]
+        indptr = np.zeros(number_of_nodes + 1, dtype=index_dtype)
+        np.cumsum(
+            np.bincount(sources[begin:end], minlength=number_of_nodes),
+            out=indptr[1:],
+        )
+        matrices[
+            label.item() if isinstance(label, np.generic) else label
+        ] = sparse.csr_matrix(
+            (
+                np.ones(end - begin, dtype=bool),
+                targets[begin:end].astype(index_dtype),
+                indptr,
+            ),
+            shape=(number_of_nodes, number_of_nodes),
+        )
+    return matrices
 
-def transitive_closure(matrix):
+
+def get_states_index(graph: EpsilonNFA):
+    """
+    Numbers the states of the automaton in the same way as get_boolean_matrix does
+
+    :param graph: EpsilonNFA
+    :return: dictionary from state to its index
+    """
+    return {state: i for (i, state) in enumerate(graph.states)}
+
+
+def transitive_closure(matrix, strategy="auto", backend="auto", stats=None):
     """
     Makes a transitive closure of matrix
     :param matrix: closing matrix
-    :return: closed matrix
-    """
-    all = matrix.getnnz()
-    start = 0
-    while start != all:
-        matrix += matrix @ matrix
-        start = all
-        all = matrix.nnz
-    return matrix
+    :param strategy: "semi_naive" propagates only the pairs added on the previous step,
+        "scc" condenses strongly connected components and closes them in topological order,
+        "auto" chooses by the number of components
+    :param backend: backend of boolean matrix operations, see get_backend,
+        the semi-naive closure runs on it unless the backend is sparse
+    :param stats: EngineStats receiving the rounds and products of the semi-naive closure
+        or the time of the scc closure, nothing is measured if None
+    :return: closed csr matrix
+    """
+    matrix = sparse.csr_matrix(matrix, dtype=bool)
+    matrix.eliminate_zeros()
+    backend = get_backend(backend, [matrix])
+    if backend.name != "sparse" and strategy in ("auto", "semi_naive"):
+        return update_transitive_closure(
+            sparse.csr_matrix(matrix.shape, dtype=bool), matrix, backend, stats
+        )
+    components = None
+    if strategy == "auto":
+        components = csgraph.connected_components(
+            matrix, directed=True, connection="strong"
+        )
+        strategy = "scc" if components[0] <= SCC_MAX_COMPONENTS else "semi_naive"
+    if strategy == "scc":
+        if components is None:
+            components = csgraph.connected_components(
+                matrix, directed=True, connection="strong"
+            )
+        begin = time.perf_counter()
+        closure = _scc_closure(matrix, components)
+        if stats is not None:
+            stats.record(
+                "transitive_closure",
+                "scc",
+                time=time.perf_counter() - begin,
+                components=int(components[0]),
+                nnz=closure.nnz,
+                density=closure.nnz / max(1, closure.shape[0] * closure.shape[1]),
+            )
+        return closure
+    if strategy == "semi_naive":
+        return update_transitive_closure(
+            sparse.csr_matrix(matrix.shape, dtype=bool), matrix, stats=stats
+        )
+    raise ValueError(f"Unknown transitive closure strategy: {strategy}")
+
+
+def _scc_closure(matrix, components=None):
+    """
+    Transitive closure through the condensation of the graph: every component
+    reaches the union of its successors and their reachable sets, which are
+    computed in reverse topological order as bitsets over components
+    :param matrix: csr matrix
+    :param components: result of connected_components for matrix if already known
+    :return: closed csr matrix
+    """
+    if components is None:
+        components = csgraph.connected_components(
+            matrix, directed=True, connection="strong"
+        )
+    count, labels = components
+    rows, cols = matrix.nonzero()
+    rows, cols = labels[rows], labels[cols]
+    # a component reaches itself if it has a cycle: more than one vertex or a loop
+    cyclic = np.bincount(labels, minlength=count) > 1
+    cyclic[rows[rows == cols]] = True
+    outer = rows != cols
+    condensation = sparse.csr_matrix(
+        (np.ones(outer.sum(), dtype=bool), (rows[outer], cols[outer])),
+        shape=(count, count),
+    )
+
+    indegree = np.diff(condensation.tocsc().indptr)
+    order = []
+    queue = list(np.flatnonzero(indegree == 0))
+    while queue:
+        c = queue.pop()
+        order.append(c)
+        for d in condensation.indices[
+            condensation.indptr[c] : condensation.indptr[c + 1]
+        ]:
+            indegree[d] -= 1
+            if indegree[d] == 0:
+                queue.append(d)
+
+    reach = [0] * count
+    for c in reversed(order):
+        bits = 1 << int(c) if cyclic[c] else 0
+        for d in condensation.indices[
+            condensation.indptr[c] : condensation.indptr[c + 1]
+        ]:
+            bits |= reach[d] | (1 << int(d))
+        reach[c] = bits
+
+    n_bytes = (count + 7) // 8
+    reach_rows, reach_cols = [], []
+    for c, bits in enumerate(reach):
+        if bits:
+            reached = np.flatnonzero(
+                np.unpackbits(
+                    np.frombuffer(bits.to_bytes(n_bytes, "little"), dtype=np.uint8),
+                    bitorder="little",
+                )
+            )
+            reach_rows.append(np.full(len(reached), c))
+            reach_cols.append(reached)
+    if not reach_rows:
+        return sparse.csr_matrix(matrix.shape, dtype=bool)
+    reach_rows = np.concatenate(reach_rows)
+    reach_cols = np.concatenate(reach_cols)
+    closure = sparse.csr_matrix(
+        (np.ones(len(reach_rows), dtype=bool), (reach_rows, reach_cols)),
+        shape=(count, count),
+    )
+    # vertices inherit the reachability of their components
+    membership = sparse.csr_matrix(
+        (np.ones(len(labels), dtype=bool), (np.arange(len(labels)), labels)),
+        shape=(len(labels), count),
+    )
+    return membership @ closure @ membership.T.tocsr()
+
+
+def update_transitive_closure(closure, delta, backend="auto", stats=None):
+    """
+    Adds edges to an already transitively closed matrix,
+    propagating only the pairs that appear because of the new edges
+    :param closure: transitively closed csr matrix
+    :param delta: matrix of added edges of the same shape
+    :param backend: backend of boolean matrix operations, see get_backend
+    :param stats: EngineStats receiving the rounds and products, nothing is measured if None
+    :return: closed csr matrix
+    """
+    delta = sparse.csr_matrix(delta, dtype=bool)
+    backend = get_backend(backend, [closure, delta])
+    closure = backend.from_sparse(closure)
+    new = backend.difference(backend.from_sparse(delta), closure)
+    closure = backend.add(closure, new)
+    iteration = 0
+    while backend.nnz(new):
+        iteration += 1
+        begin = time.perf_counter()
+        # paths through the old part are already closed, so every new pair
+        # goes through at least one pair added on the previous step
+        step = backend.add(
+            multiply(
+                backend,
+                new,
+                closure,
+                stats,
+                "transitive_closure",
+                iteration,
+                "new * closure",
+            ),
+            multiply(
+                backend,
+                closure,
+                new,
+                stats,
+                "transitive_closure",
+                iteration,
+                "closure * new",
+            ),
+        )
+        new = backend.difference(step, closure)
+        closure = backend.add(closure, new)
+        if stats is not None:
+            stats.record_iteration(
+                "transitive_closure",
+                iteration,
+                time.perf_counter() - begin,
+                {"closure": closure},
+                backend,
+                {"closure": backend.nnz(new)},
+            )
+    return backend.to_sparse(closure)
 
 
 def get_graph_intersection_by_matrix(matrix_fst_fa, matrix_snd_fa):
@@ -53,13 +301,88 @@ def get_graph_intersection_by_matrix(matrix_fst_fa, matrix_snd_fa):
     makes their kron multiplication and adds up all the results
     :param matrix_fst_fa: first boolean matrix
     :param matrix_snd_fa: second boolean matrix
-    :return: boolean intersection matrix
+    :return: boolean intersection csr matrix
     """
     intersection_labels = matrix_fst_fa.keys() & matrix_snd_fa.keys()
     shape_fst = matrix_fst_fa[list(matrix_fst_fa.keys())[0]].shape[0]
     shape_snd = matrix_snd_fa[list(matrix_snd_fa.keys())[0]].shape[0]
     shape_intersection = shape_fst * shape_snd
-    matrix = sparse.dok_matrix((shape_intersection, shape_intersection), dtype=bool)
+    matrix = sparse.csr_matrix((shape_intersection, shape_intersection), dtype=bool)
     for label in intersection_labels:
-        matrix += sparse.kron(matrix_fst_fa[label], matrix_snd_fa[label])
+        matrix = matrix + sparse.kron(
+            matrix_fst_fa[label], matrix_snd_fa[label], format="csr"
+        )
     return matrix
+
+
+def get_reachable_graph_intersection(
+    matrix_fst_fa, matrix_snd_fa, start_fst, start_snd, shape
+):
+    """
+    Builds the intersection of boolean matrices lazily: only the pairs of states
+    reachable from the pairs of start states are discovered by frontier expansion
+    over the matrices of each label, the rest of the Kronecker product is never built
+    :param matrix_fst_fa: first boolean matrix
+    :param matrix_snd_fa: second boolean matrix
+    :param start_fst: indices of the start states of the first automaton
+    :param start_snd: indices of the start states of the second automaton
+    :param shape: numbers of states of the first and of the second automaton
+    :return: boolean intersection matrix over the reachable pairs and the sorted array
+        of their indices in the full intersection, pair (i, j) has index i * shape[1] + j
+    """
+    shape_fst, shape_snd = shape
+    labels = matrix_fst_fa.keys() & matrix_snd_fa.keys()
+    fst = {label: sparse.csr_matrix(matrix_fst_fa[label]) for label in labels}
+    # transitions of the second automaton: state to a list of (label, next state)
+    transitions = [[] for _ in range(shape_snd)]
+    for label in labels:
+        for q, p in zip(*matrix_snd_fa[label].nonzero()):
+            transitions[q].append((label, p))
+
+    # visited[q] marks the states of the first automaton paired with state q,
+    # front[q] and found[q] are the arrays of those states in the frontier and in total
+    visited = np.zeros((shape_snd, shape_fst), dtype=bool)
+    empty = np.zeros(0, dtype=np.int64)
+    front = [empty] * shape_snd
+    start_fst = np.unique(np.asarray(start_fst, dtype=np.int64))
+    for q in set(start_snd):
+        visited[q, start_fst] = True
+        front[q] = start_fst
+    found = [[states] for states in front]
+    active = [q for q in range(shape_snd) if len(front[q])]
+    while active:
+        reached = dict()
+        for q in active:
+            for label, p in transitions[q]:
+                reached.setdefault(p, []).append(fst[label][front[q]].indices)
+        front = [empty] * shape_snd
+        active = []
+        for p, arrays in reached.items():
+            states = np.unique(np.concatenate(arrays))
+            states = states[~visited[p, states]]
+            if len(states):
+                visited[p, states] = True
+                front[p] = states
+                found[p].append(states)
+                active.append(p)
+
+    # edges between reachable pairs, every successor of a reachable pair is reachable
+    rows, cols, pairs = [], [], []
+    for q in range(shape_snd):
+        states = np.sort(np.concatenate(found[q]))
+        if len(states) == 0:
+            continue
+        pairs.append(states * shape_snd + q)
+        for label, p in transitions[q]:
+            sub = fst[label][states]
+            rows.append(np.repeat(states, np.diff(sub.indptr)) * shape_snd + q)
+            cols.append(sub.indices.astype(np.int64) * shape_snd + p)
+    reachable = np.sort(np.concatenate(pairs + [empty]))
+    if rows:
+        rows = np.searchsorted(reachable, np.concatenate(rows))
+        cols = np.searchsorted(reachable, np.concatenate(cols))
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=bool), (rows, cols)),
+        shape=(len(reachable), len(reachable)),
+    )
+    return matrix, reachable
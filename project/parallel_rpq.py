@@ -0,0 +1,110 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from project.finite_state_machine_manager import MS_RPQ_MEMORY_BUDGET, ms_rpq
+from project.graph_index import GraphIndex, get_graph_index
+
+# index loaded once by every worker of the pool
+_worker_index = None
+
+
+def _load_index(directory):
+    global _worker_index
+    _worker_index = GraphIndex().load(directory, mmap_mode="r")
+
+
+def _ms_rpq_partition(task):
+    return ms_rpq(_worker_index, *task)
+
+
+def get_partitions(vertices, number_of_partitions):
+    """
+        Splits the vertices into partitions of nearly equal size
+
+    :param vertices: list of vertices
+    :param number_of_partitions: maximum number of partitions
+    :return: list of nonempty partitions
+    """
+    number_of_partitions = max(1, min(number_of_partitions, len(vertices)))
+    size, rest = divmod(len(vertices), number_of_partitions)
+    partitions = []
+    begin = 0
+    for i in range(number_of_partitions):
+        end = begin + size + (1 if i < rest else 0)
+        partitions.append(vertices[begin:end])
+        begin = end
+    return [partition for partition in partitions if partition]
+
+
+def parallel_ms_rpq(
+    graph,
+    regex,
+    start_vertex=None,
+    end_vertex=None,
+    for_each=True,
+    workers=None,
+    partitions_per_worker=4,
+    chunk_size=None,
+    memory_budget=MS_RPQ_MEMORY_BUDGET,
+    backend="auto",
+    directory=None,
+):
+    """
+    Multiple-source regular path query with the start vertices split across a pool of processes.
+    The index of the graph is stored once as .npy arrays which the workers memory-map,
+    so the adjacency matrices are not pickled for every task
+    :param graph: query graph (MultiDiGraph or GraphIndex)
+    :param regex: regular expression as a string or CompiledQuery
+    :param start_vertex: starting vertices of the graph
+    :param end_vertex: final vertices of the graph
+    :param for_each: return pairs of a start vertex and a reachable vertex (true)
+        or only vertices reachable from any start vertex (false)
+    :param workers: number of processes, the number of cpus if None
+    :param partitions_per_worker: number of partitions of the start vertices for each worker
+    :param chunk_size: number of start vertices processed at once by a worker
+    :param memory_budget: bytes for the visited states of all workers, used if chunk_size is None,
+        the answers of the partitions are collected into one set outside of the budget
+    :param backend: backend of boolean matrix operations, see get_backend
+    :param directory: directory for the stored index, a temporary one if None
+    :return: set of pairs of vertices or set of vertices
+    """
+    index = get_graph_index(graph)
+    workers = workers or os.cpu_count() or 1
+    starts = [index.nodes[i] for i in index.get_ids(start_vertex)]
+    if workers == 1:
+        return ms_rpq(
+            index,
+            regex,
+            starts,
+            end_vertex,
+            for_each,
+            chunk_size,
+            memory_budget,
+            backend,
+        )
+
+    tasks = [
+        (
+            regex,
+            partition,
+            end_vertex,
+            for_each,
+            chunk_size,
+            memory_budget // workers,
+            backend,
+        )
+        for partition in get_partitions(starts, workers * partitions_per_worker)
+    ]
+    with (
+        nullcontext(directory) if directory else tempfile.TemporaryDirectory()
+    ) as directory:
+        index.save(directory)
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_load_index, initargs=(directory,)
+        ) as pool:
+            answer = set()
+            for result in pool.map(_ms_rpq_partition, tasks):
+                answer |= result
+            return answer
@@ -1,3 +1,6 @@
+from pyformlang.cfg import CFG
+from pyformlang.finite_automaton import EpsilonNFA, State, Symbol
+
 from project.ecfg import ECFG
 from project.matrix_manager import get_boolean_matrix
 
@@ -14,6 +17,7 @@ class RSM:
     def minimize(self):
         for head, body in self.productions.items():
             self.productions[head] = body.minimize()
+            self.matrixes[head] = get_boolean_matrix(self.productions[head])
         return self
 
     def from_ecfg(self, ecfg: ECFG):
@@ -22,3 +26,29 @@ class RSM:
             self.productions[head] = production
             self.matrixes[head] = get_boolean_matrix(production)
         return self
+
+    def from_cfg(self, cfg: CFG):
+        """
+        Builds boxes directly from the productions of cfg,
+        each production is a path from the start state to the final state of its box
+        """
+        boxes = dict()
+        for production in cfg.productions:
+            box = boxes.setdefault(production.head, EpsilonNFA())
+            start = State(0)
+            final = State(1)
+            box.add_start_state(start)
+            box.add_final_state(final)
+            if not production.body:
+                box.add_final_state(start)
+                continue
+            current = start
+            for symbol in production.body[:-1]:
+                state = State(len(box.states))
+                box.add_transition(current, Symbol(symbol.value), state)
+                current = state
+            box.add_transition(current, Symbol(production.body[-1].value), final)
+        for head, box in boxes.items():
+            self.productions[head] = box
+            self.matrixes[head] = get_boolean_matrix(box)
+        return self
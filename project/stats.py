@@ -0,0 +1,159 @@
+import json
+import time
+
+
+class EngineStats:
+    """
+    Records of the fixpoint engines (matrix, BFS, transitive_closure) as flat dictionaries:
+    "product" for every matrix product with its time and sizes,
+    "iteration" for every round of the fixpoint and "matrix" for the size of every matrix
+    after the round. The engines measure nothing when they are given stats=None
+    """
+
+    def __init__(self, callback=None):
+        """
+        :param callback: function called with every record as soon as it is made
+        """
+        # records in the order they are made
+        self.records = []
+        self.callback = callback
+
+    def record(self, engine, event, **values):
+        """
+            Adds the record and passes it to the callback
+
+        :param engine: name of the engine
+        :param event: kind of the record
+        :param values: measured values
+        :return: the record
+        """
+        record = {"engine": engine, "event": event, **values}
+        self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+        return record
+
+    def multiply(self, backend, a, b, engine, iteration, name):
+        """
+            Product of the matrices by the backend recorded with its time and sizes
+
+        :param name: name of the product, e.g. the production or the label
+        :return: product of the matrices
+        """
+        begin = time.perf_counter()
+        product = backend.multiply(a, b)
+        elapsed = time.perf_counter() - begin
+        self.record(
+            engine,
+            "product",
+            iteration=iteration,
+            name=name,
+            time=elapsed,
+            left_nnz=backend.nnz(a),
+            right_nnz=backend.nnz(b),
+            nnz=backend.nnz(product),
+        )
+        return product
+
+    def record_iteration(
+        self, engine, iteration, elapsed, matrices, backend, added=None, **values
+    ):
+        """
+            Records the round of the fixpoint and the sizes of the matrices after it
+
+        :param iteration: number of the round from 1
+        :param elapsed: seconds of the round
+        :param matrices: dictionary from the name to the matrix of the backend
+        :param added: dictionary from the name to the number of pairs added on the round
+        :param values: other measured values of the round
+        """
+        added = added or {}
+        total = 0
+        for name, matrix in matrices.items():
+            nnz = backend.nnz(matrix)
+            total += nnz
+            self.record(
+                engine,
+                "matrix",
+                iteration=iteration,
+                name=str(name),
+                nnz=nnz,
+                added=added.get(name, 0),
+                density=nnz / max(1, matrix.shape[0] * matrix.shape[1]),
+            )
+        self.record(
+            engine,
+            "iteration",
+            iteration=iteration,
+            time=elapsed,
+            nnz=total,
+            added=sum(added.values()),
+            **values,
+        )
+
+    def get_records(self, engine=None, event=None):
+        """
+        Records of the engine and the kind, all records if None
+        """
+        return [
+            record
+            for record in self.records
+            if (engine is None or record["engine"] == engine)
+            and (event is None or record["event"] == event)
+        ]
+
+    def summary(self):
+        """
+            Totals by engine: number of rounds and products, time of the rounds and of the products,
+            and the products by name sorted by their total time
+
+        :return: dictionary from the engine to its totals
+        """
+        result = {}
+        for record in self.records:
+            totals = result.setdefault(
+                record["engine"],
+                {
+                    "iterations": 0,
+                    "time": 0.0,
+                    "products": 0,
+                    "product_time": 0.0,
+                    "product_time_by_name": {},
+                },
+            )
+            if record["event"] == "iteration":
+                totals["iterations"] += 1
+                totals["time"] += record["time"]
+            elif record["event"] == "product":
+                totals["products"] += 1
+                totals["product_time"] += record["time"]
+                by_name = totals["product_time_by_name"]
+                by_name[record["name"]] = (
+                    by_name.get(record["name"], 0.0) + record["time"]
+                )
+        for totals in result.values():
+            totals["product_time_by_name"] = dict(
+                sorted(totals["product_time_by_name"].items(), key=lambda x: -x[1])
+            )
+        return result
+
+    def to_json(self, path):
+        """
+        Stores the records as a JSON list
+        """
+        with open(path, "w") as file:
+            json.dump(self.records, file, indent=2)
+        return self
+
+    def clear(self):
+        self.records = []
+        return self
+
+
+def multiply(backend, a, b, stats=None, engine=None, iteration=None, name=None):
+    """
+    Product of the matrices by the backend, measured if stats are given
+    """
+    if stats is None:
+        return backend.multiply(a, b)
+    return stats.multiply(backend, a, b, engine, iteration, name)
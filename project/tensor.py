@@ -0,0 +1,153 @@
+from pyformlang.cfg import CFG, Variable
+from scipy import sparse
+
+from project.context_free_grammar import get_cfg_from_file, get_cfg_from_text
+from project.ecfg import ECFG
+from project.graph_index import get_graph_index
+from project.graph_io import load_graph_index
+from project.matrix_manager import (
+    get_states_index,
+    transitive_closure,
+    update_transitive_closure,
+)
+from project.rsm import RSM
+
+
+def get_rsm(cfg) -> RSM:
+    """
+        Builds a minimized recursive state machine for the tensor algorithm
+
+    :param cfg: context-free grammar (can be string, path_to_file, CFG, ECFG or RSM object)
+    :return: recursive state machine with deterministic boxes
+    """
+    if isinstance(cfg, str):
+        try:
+            cfg = get_cfg_from_file(cfg)
+        except OSError:
+            cfg = get_cfg_from_text(cfg)
+    if isinstance(cfg, CFG):
+        rsm = RSM().from_cfg(cfg)
+    elif isinstance(cfg, ECFG):
+        rsm = RSM().from_ecfg(cfg)
+    else:
+        rsm = cfg
+    return rsm.minimize()
+
+
+def tensor(graph, cfg, backend="auto"):
+    """
+        Finds paths in the graph between vertices according
+        to the conditions of grammar with the help
+        of the Tensor algorithm: the recursive state machine is intersected
+        with the graph by the Kronecker product, and the transitive closure
+        of the intersection is extended only by the new nonterminal edges
+    :param graph: the graph representation of the automaton (MultiDiGraph or GraphIndex)
+    :param cfg: context-free grammar (can be string, path_to_file, CFG, ECFG or RSM object)
+    :param backend: backend of boolean matrix operations of the closure, see get_backend
+    :return: a set of triples of a species (non-terminus, vertex, vertex).
+    """
+    rsm = get_rsm(cfg)
+    index = get_graph_index(graph)
+    nodes = index.nodes
+    n = index.number_of_nodes
+
+    # all boxes share one numbering of states
+    heads = {head.value: head for head in rsm.productions}
+    box_start = {}
+    box_finals = {}
+    offset = 0
+    rsm_edges = {}
+    for head, box in rsm.productions.items():
+        states = get_states_index(box)
+        box_start[head] = [offset + states[state] for state in box.start_states]
+        box_finals[head] = [offset + states[state] for state in box.final_states]
+        for symbol, m in rsm.matrixes[head].items():
+            rows, cols = m.nonzero()
+            label_rows, label_cols = rsm_edges.setdefault(symbol.value, ([], []))
+            label_rows.extend(rows + offset)
+            label_cols.extend(cols + offset)
+        offset += len(states)
+    rsm_matrix = {
+        label: sparse.csr_matrix(
+            ([True] * len(rows), (rows, cols)), shape=(offset, offset), dtype=bool
+        )
+        for label, (rows, cols) in rsm_edges.items()
+    }
+
+    graph_matrix = {
+        label: m
+        for label, m in index.matrices.items()
+        if label in rsm_matrix and label not in heads
+    }
+    # nonterminal edges, a nullable box gives a loop at every vertex
+    result = {}
+    for value, head in heads.items():
+        nullable = set(box_start[head]) & set(box_finals[head])
+        result[value] = (
+            sparse.identity(n, dtype=bool, format="csr")
+            if nullable
+            else sparse.csr_matrix((n, n), dtype=bool)
+        )
+    graph_matrix.update(result)
+
+    delta = graph_matrix
+    closure = None
+    while delta:
+        intersection = sparse.csr_matrix((offset * n, offset * n), dtype=bool)
+        for label, m in delta.items():
+            if label in rsm_matrix and m.nnz:
+                intersection = intersection + sparse.kron(
+                    rsm_matrix[label], m, format="csr"
+                )
+        closure = (
+            transitive_closure(intersection, backend=backend)
+            if closure is None
+            else update_transitive_closure(closure, intersection, backend)
+        )
+        delta = {}
+        for value, head in heads.items():
+            reached = sparse.csr_matrix((n, n), dtype=bool)
+            for start in box_start[head]:
+                rows = closure[start * n : (start + 1) * n]
+                for final in box_finals[head]:
+                    reached = reached + rows[:, final * n : (final + 1) * n]
+            new = reached > result[value]
+            if new.nnz:
+                delta[value] = new
+                result[value] = result[value] + new
+
+    return {
+        (heads[value], nodes[v], nodes[u])
+        for value, m in result.items()
+        for v, u in zip(*m.nonzero())
+    }
+
+
+def context_free_path_querying_by_tensor(
+    graph,
+    cfg,
+    start_vertex=None,
+    end_vertex=None,
+    start_symbol=Variable("S"),
+    backend="auto",
+):
+    """
+        Based on the Tensor algorithm solves the reachability problem
+    :param graph: the graph representation of the automaton (path_to_file, MultiDiGraph or GraphIndex)
+    :param cfg: context-free grammar (can be string, path_to_file, CFG, ECFG or RSM object)
+    :param start_vertex: the vertices that are the starting values of the automaton
+    :param end_vertex: the vertices that are finite values of the automaton
+    :param start_symbol: start symbol, S by default
+    :param backend: backend of boolean matrix operations, see get_backend
+    :return:
+    """
+    index = load_graph_index(graph)
+    if start_vertex is None:
+        start_vertex = index.vertices
+    if end_vertex is None:
+        end_vertex = index.vertices
+    return {
+        (v, u)
+        for (nt, v, u) in tensor(index, cfg, backend)
+        if v in start_vertex and u in end_vertex and nt == start_symbol
+    }
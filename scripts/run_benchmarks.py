@@ -0,0 +1,71 @@
+import argparse
+import json
+import sys
+
+import shared
+
+sys.path.insert(0, str(shared.ROOT))
+
+from project.benchmark import *
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measures the path query engines and compares them with a baseline"
+    )
+    parser.add_argument("--graphs", nargs="+", default=DEFAULT_GRAPHS)
+    parser.add_argument("--queries", nargs="+", default=list(QUERIES))
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--time-threshold", type=float, default=TIME_THRESHOLD)
+    parser.add_argument("--memory-threshold", type=float, default=MEMORY_THRESHOLD)
+    args = parser.parse_args()
+
+    def print_result(result):
+        if result["status"] == "ok":
+            print(
+                f"{result['graph']} {result['query']} {result['engine']}: "
+                f"{result['time']:.3f} s, {result['peak_rss'] / 2 ** 20:.0f} MiB, "
+                f"{result['answer_size']} pairs"
+            )
+        else:
+            # the whole traceback is kept in the saved results
+            error = result.get("error", "").strip().split("\n")[-1]
+            print(
+                f"{result['graph']} {result['query']} {result['engine']}: "
+                f"{result['status']} {error}"
+            )
+
+    report = run_benchmarks(
+        args.graphs,
+        args.queries,
+        args.engines,
+        args.repeats,
+        args.timeout,
+        print_result,
+    )
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print("Results are saved to", args.output)
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+        regressions = compare_with_baseline(
+            report, baseline, args.time_threshold, args.memory_threshold
+        )
+        for regression in regressions:
+            print(
+                "Regression: {graph} {query} {engine} {metric}: "
+                "{baseline} -> {value}".format(**regression)
+            )
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
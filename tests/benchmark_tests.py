@@ -0,0 +1,76 @@
+import pytest
+
+from project.benchmark import *
+
+
+def test_get_benchmark_graph():
+    index = get_benchmark_graph("two_cycles:3:2")
+    assert index.number_of_nodes == 6
+    assert index.label_statistics == {"a": 4, "b": 3}
+    assert get_benchmark_graph("random:10:20:1").number_of_nodes == 10
+    cfg, regex = get_query(index, "regular")
+    assert regex == "a* b"
+    assert get_query(index, "dyck")[1] is None
+
+
+def test_get_cases():
+    cases = get_cases(["chain:3"], ["dyck", "regular"], ["matrix", "ms_rpq"])
+    assert cases == [
+        ("chain:3", "dyck", "matrix"),
+        ("chain:3", "regular", "matrix"),
+        ("chain:3", "regular", "ms_rpq"),
+    ]
+
+
+def test_run_benchmarks():
+    report = run_benchmarks(["two_cycles:3:2"], ["regular"], repeats=1)
+    assert len(report["results"]) == len(ENGINES)
+    for result in report["results"]:
+        assert result["status"] == "ok"
+        assert result["answer_size"] == 6
+        assert result["peak_rss"] >= result["load_rss"] > 0
+    assert compare_with_baseline(report, report) == []
+
+    result = run_case("chain:x", "regular", "matrix")
+    assert result["status"] == "error"
+    assert "ValueError" in result["error"]
+
+
+def test_run_case_timeout():
+    result = run_case("random:2000:20000", "dyck", "hellings", timeout=0.01)
+    assert result["status"] == "timeout"
+
+
+def test_compare_with_baseline():
+    def get_report(**changes):
+        result = {
+            "graph": "g",
+            "query": "q",
+            "engine": "e",
+            "status": "ok",
+            "time": 1.0,
+            "peak_rss": 100,
+            "answer_size": 5,
+        }
+        result.update(changes)
+        return {"results": [result]}
+
+    baseline = get_report()
+    assert compare_with_baseline(get_report(time=1.2), baseline) == []
+    assert [
+        regression["metric"]
+        for regression in compare_with_baseline(
+            get_report(time=2.0, peak_rss=200, answer_size=4), baseline
+        )
+    ] == ["answer_size", "time", "peak_rss"]
+    assert compare_with_baseline(get_report(status="timeout"), baseline) == [
+        {
+            "graph": "g",
+            "query": "q",
+            "engine": "e",
+            "metric": "status",
+            "baseline": "ok",
+            "value": "timeout",
+        }
+    ]
+    assert compare_with_baseline(get_report(time=2.0), get_report(graph="h")) == []
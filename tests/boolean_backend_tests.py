@@ -0,0 +1,63 @@
+import cfpq_data
+import numpy as np
+import pytest
+from scipy import sparse
+
+from project import cfpq
+from project.boolean_backend import *
+from project.finite_state_machine_manager import ap_rpq, ms_rpq
+
+
+@pytest.mark.parametrize("name", ["sparse", "dense", "bitset"])
+def test_operations(name):
+    backend = get_backend(name)
+    a = sparse.random(70, 90, density=0.1, random_state=1, format="csr") > 0
+    b = sparse.random(90, 65, density=0.1, random_state=2, format="csr") > 0
+    c = sparse.random(70, 90, density=0.1, random_state=3, format="csr") > 0
+    x, y, z = backend.from_sparse(a), backend.from_sparse(b), backend.from_sparse(c)
+
+    def check(result, expected):
+        expected = sparse.csr_matrix(expected, dtype=bool)
+        assert (backend.to_sparse(result) != expected).nnz == 0
+        assert backend.nnz(result) == expected.nnz
+        rows, cols = backend.nonzero(result)
+        assert set(zip(rows, cols)) == set(zip(*expected.nonzero()))
+
+    check(backend.multiply(x, y), a @ b)
+    # a product of a few entries
+    d = sparse.csr_matrix(([True, True, True], ([1, 1, 3], [5, 7, 5])), shape=(4, 90))
+    check(backend.multiply(backend.from_sparse(d), y), d @ b)
+    check(backend.add(x, z), a + c)
+    check(backend.difference(x, z), a > c)
+    check(
+        backend.kron(backend.from_sparse(a[:9, :8]), backend.from_sparse(b[:7, :6])),
+        sparse.kron(a[:9, :8], b[:7, :6]),
+    )
+    mask = np.arange(70) % 3 == 0
+    check(backend.select_rows(x, mask), sparse.diags(mask, dtype=bool) @ a)
+    check(backend.identity(5), sparse.identity(5))
+    check(backend.zeros((3, 4)), sparse.csr_matrix((3, 4)))
+    check(backend.zeros((0, 4)), sparse.csr_matrix((0, 4)))
+
+
+def test_get_backend():
+    assert get_backend("auto", [sparse.identity(1000, format="csr")]).name == "sparse"
+    assert get_backend("auto", [sparse.csr_matrix(np.ones((10, 10)))]).name == "dense"
+    assert get_backend("bitset").name == "bitset"
+    with pytest.raises(ValueError):
+        get_backend("gpu")
+
+
+@pytest.mark.parametrize("name", ["sparse", "dense", "bitset"])
+def test_engines_on_backend(name):
+    graph = cfpq_data.labeled_two_cycles_graph(3, 2, labels=("a", "b"))
+    cfg = "S -> a S b | a b"
+    expected = cfpq.matrix(graph, cfg, backend="sparse")
+    assert cfpq.matrix(graph, cfg, backend=name) == expected
+    assert cfpq.matrix(graph, cfg, False, backend=name) == expected
+    assert cfpq.matrix(graph, cfg, start_vertex=[0, 1], backend=name) == {
+        (v, u) for v, u in expected if v in [0, 1]
+    }
+    assert cfpq.tensor(graph, cfg, backend=name) == expected
+    assert ap_rpq(graph, "a* b", backend=name) == ap_rpq(graph, "a* b")
+    assert ms_rpq(graph, "a* b", backend=name) == ms_rpq(graph, "a* b")
@@ -1,5 +1,6 @@
 import cfpq_data
 import pytest
+from networkx import MultiDiGraph
 
 from project import cfpq
 from project.context_free_grammar import *
@@ -89,3 +90,77 @@ def test_context_free_path_queruing_by_matrix_3():
     graph = cfpq_data.labeled_two_cycles_graph(2, 3, labels=("a", "b"))
     cfg = CFG.from_text("S -> ( S ) S\nS -> S ( S )\nS -> epsilon")
     assert cfpq.matrix(graph, cfg) == {(4, 4), (5, 5), (0, 0), (1, 1), (3, 3), (2, 2)}
+
+
+def test_hellinges_with_named_vertices():
+    graph = MultiDiGraph()
+    graph.add_edge("x", "y", label="a")
+    graph.add_edge("y", "z", label="b")
+    graph.add_edge("z", "x", label="a")
+    cfg = CFG.from_text("S -> a S b | a b")
+    assert {(v, u) for (nt, v, u) in hellinges(graph, cfg) if nt == "S"} == {("x", "z")}
+
+
+@pytest.mark.parametrize(
+    "cfg",
+    [
+        "S -> a S b S | epsilon",
+        "S -> a S | P\nP -> b P | b",
+        "S -> ( S ) S\nS -> S ( S )\nS -> epsilon",
+    ],
+)
+def test_matrix_semi_naive_equals_naive(cfg):
+    graph = cfpq_data.labeled_two_cycles_graph(3, 2, labels=("a", "b"))
+    cfg = CFG.from_text(cfg)
+    assert matrix(graph, cfg, semi_naive=True) == matrix(graph, cfg, semi_naive=False)
+    assert cfpq.matrix(graph, cfg) == cfpq.hellings(graph, cfg)
+
+
+def test_compile_grammar_is_cached(tmp_path):
+    GRAMMAR_CACHE.clear()
+    grammar = compile_grammar(CFG.from_text("S -> a S b S | epsilon"))
+    assert compile_grammar(CFG.from_text("S -> epsilon | a S b S")) is grammar
+    assert grammar.eps_heads == {Variable("S")}
+    assert set(grammar.terminal_heads.keys()) == {"a", "b"}
+    assert len(grammar.binary_productions) == 3
+
+    GRAMMAR_CACHE.clear()
+    stored = compile_grammar("S -> a b", cache_dir=tmp_path)
+    GRAMMAR_CACHE.clear()
+    loaded = compile_grammar("S -> a b", cache_dir=tmp_path)
+    assert loaded is not stored
+    assert loaded.cfg.productions == stored.cfg.productions
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+@pytest.mark.parametrize(
+    "cfg",
+    [
+        "S -> a b",
+        "S -> a S | P\nP -> b P | b",
+        "S -> ( S ) S\nS -> S ( S )\nS -> epsilon",
+        "S -> a S b S | epsilon",
+    ],
+)
+def test_context_free_path_queruing_by_tensor(cfg):
+    graph = cfpq_data.labeled_two_cycles_graph(2, 3, labels=("a", "b"))
+    cfg = CFG.from_text(cfg)
+    assert cfpq.tensor(graph, cfg) == cfpq.hellings(graph, cfg)
+
+
+@pytest.mark.parametrize(
+    "cfg",
+    [
+        "S -> a S | P\nP -> b P | b",
+        "S -> a S b S | epsilon",
+    ],
+)
+def test_context_free_path_queruing_by_matrix_from_sources(cfg):
+    graph = cfpq_data.labeled_two_cycles_graph(3, 2, labels=("a", "b"))
+    cfg = CFG.from_text(cfg)
+    expected = {(v, u) for (v, u) in cfpq.hellings(graph, cfg) if v in {1, 4}}
+    assert cfpq.matrix(graph, cfg, start_vertex={1, 4}) == expected
+    assert cfpq.matrix(graph, cfg, False, start_vertex={1, 4}) == expected
+    assert multiple_source_matrix(graph, cfg, [1, 4]) == expected
+    assert multiple_source_matrix(graph, cfg, [1, 4], semi_naive=False) == expected
+    assert multiple_source_matrix(graph, cfg, []) == set()
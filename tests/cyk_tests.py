@@ -0,0 +1,71 @@
+import itertools
+import random
+
+import pytest
+from pyformlang.cfg import CFG
+
+from project.cyk import *
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "S -> a S b S | epsilon",
+        "S -> a S b | a b",
+        "S -> A B | C\nA -> a A | epsilon\nB -> b\nC -> c C c | d",
+        "S -> epsilon",
+        # more nonterminals than bits in one word of a mask
+        "\n".join(f"V{i} -> a V{i + 1} | b" for i in range(70)).replace("V0", "S")
+        + "\nV70 -> c",
+    ],
+)
+def test_cyk_batch(text):
+    cfg = CFG.from_text(text)
+    alphabet = sorted(terminal.value for terminal in cfg.terminals) + ["z"]
+    words = [
+        "".join(word)
+        for length in range(6)
+        for word in itertools.product(alphabet, repeat=length)
+    ][:3000]
+    generator = random.Random(0)
+    words += [
+        "".join(generator.choice(alphabet) for _ in range(generator.randint(0, 12)))
+        for _ in range(500)
+    ]
+    expected = [cfg.contains(word) for word in words]
+    assert list(cyk_batch(words, cfg)) == expected
+    assert list(cyk_batch(iter(words), cfg, chunk_size=7)) == expected
+
+
+def test_cyk():
+    assert cyk("aabb", "S -> a S b | a b")
+    assert not cyk("aab", "S -> a S b | a b")
+    assert not cyk("", "S -> a S b | a b")
+    assert cyk("abcde", "tests/files_for_tests/some_cfg.txt")
+    assert not cyk("abcd", "tests/files_for_tests/some_cfg.txt")
+    assert cyk(["a"], get_cfg_from_file("tests/files_for_tests/simple_cfg.txt"))
+    assert list(cyk_batch([], "S -> a")) == []
+
+
+def test_compile_cnf(tmp_path):
+    CNF_CACHE.clear()
+    compiled = compile_cnf("S -> a S b | a b", cache_dir=tmp_path)
+    assert compile_cnf(CFG.from_text("S -> a b | a S b")) is compiled
+    assert compile_cnf(compiled) is compiled
+    assert not compiled.generates_epsilon
+    assert set(compiled.terminal_masks) == {"a", "b"}
+
+    CNF_CACHE.clear()
+    stored = compile_cnf("S -> a S b | a b", cache_dir=tmp_path)
+    assert stored is not compiled
+    assert stored.variables == compiled.variables
+    assert cyk("aaabbb", stored)
+
+
+def test_get_words_from_file(tmp_path):
+    path = tmp_path / "words.txt"
+    path.write_text("a b\nid ( id )\n\n")
+    words = get_words_from_file(path)
+    assert words == [["a", "b"], ["id", "(", "id", ")"], []]
+    cfg = CFG.from_text("S -> a b | id ( S ) | id | epsilon")
+    assert list(cyk_batch(words, cfg)) == [True, True, True]
@@ -82,7 +82,7 @@ def test_ms_rpq_1(cycle_count, start, final, labels, regex, result):
 @pytest.mark.parametrize(
     "cycle_count, start, final, labels, regex, result",
     [
-        ([2, 3], [1, 2, 3], [4], ["0", "1"], "1|0*", {(2, 4)}),
+        ([2, 3], [1, 2, 3], [4], ["0", "1"], "1|0*", {(3, 4)}),
         ([2, 1], [0, 1], [2], ["1", "2"], "2.(12)*", set()),
         (
             [2, 2],
@@ -122,3 +122,94 @@ def test_ms_rpq_2(cycle_count, start, final, labels, regex, result):
     )
     actual = ms_rpq(graph, regex, start, final, True)
     assert result == actual
+
+
+@pytest.mark.parametrize(
+    "start, final, regex",
+    [
+        ({0}, {1, 2, 3}, "a|b|c"),
+        (None, None, "a*"),
+        ({1, 4}, None, "a b*"),
+        ({2}, {0, 5}, "(a|b)*"),
+    ],
+)
+def test_ap_rpq_lazy(start, final, regex):
+    graph = cfpq_data.labeled_two_cycles_graph(2, 3, labels=("a", "b"))
+    assert sorted(ap_rpq(graph, regex, start, final, lazy=True)) == sorted(
+        ap_rpq(graph, regex, start, final)
+    )
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_ap_rpq_output(lazy):
+    graph = cfpq_data.labeled_two_cycles_graph(2, 3, labels=("a", "b"))
+    pairs = ap_rpq(graph, "a* b", [0, 1], None, lazy=lazy)
+    assert len(pairs) == len(set(pairs)) > 0
+    assert list(ap_rpq(graph, "a* b", [0, 1], None, lazy, "generator")) == pairs
+    matrix = ap_rpq(graph, "a* b", [0, 1], None, lazy, "matrix")
+    nodes = list(graph.nodes)
+    assert [(nodes[v], nodes[u]) for v, u in zip(*matrix.nonzero())] == pairs
+    with pytest.raises(ValueError):
+        ap_rpq(graph, "a* b", output="set")
+
+
+@pytest.mark.parametrize("regex", ["a*", "a* b", "b (a|b)*", "a a b"])
+def test_ms_rpq_equals_ap_rpq(regex):
+    graph = cfpq_data.labeled_two_cycles_graph(4, 3, labels=("a", "b"))
+    start = [0, 2, 5]
+    expected = set(ap_rpq(graph, regex, start, None))
+    assert ms_rpq(graph, regex, start, None) == expected
+    assert ms_rpq(graph, regex, start, None, for_each=False) == {u for _, u in expected}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100])
+def test_ms_rpq_stream(chunk_size):
+    graph = cfpq_data.labeled_two_cycles_graph(4, 3, labels=("a", "b"))
+    expected = ms_rpq(graph, "a* b", None, None)
+    chunks = list(ms_rpq_stream(graph, "a* b", None, None, chunk_size))
+    assert len(chunks) == -(-graph.number_of_nodes() // chunk_size)
+    assert set().union(*chunks) == expected
+    assert ms_rpq(graph, "a* b", None, None, chunk_size=chunk_size) == expected
+    assert ms_rpq(graph, "a* b", None, None, memory_budget=1) == expected
+
+
+def test_ms_rpq_stream_memory_budget():
+    graph = cfpq_data.labeled_two_cycles_graph(50, 40, labels=("a", "b"))
+    expected = set(ap_rpq(graph, "a* b"))
+    # the first chunk has a fixed size, the next ones fit one start vertex into the budget
+    chunks = list(ms_rpq_stream(graph, "a* b", memory_budget=1))
+    assert len(chunks) == 1 + graph.number_of_nodes() - MS_RPQ_FIRST_CHUNK_SIZE
+    assert set().union(*chunks) == expected
+    chunks = list(ms_rpq_stream(graph, "a* b", memory_budget=2**20))
+    assert len(chunks) == 2
+    assert set().union(*chunks) == expected
+
+
+def test_compile_query_is_cached(tmp_path):
+    QUERY_CACHE.clear()
+    query = compile_query("a* b")
+    assert compile_query(" a*   b ") is query
+    assert query.dfa.accepts(["a", "a", "b"])
+    assert query.number_of_states == len(query.start_mask) == len(query.final_mask)
+    assert list(query.final_mask.nonzero()[0]) == query.final_states
+
+    QUERY_CACHE.clear()
+    stored = compile_query("a | b", cache_dir=tmp_path)
+    QUERY_CACHE.clear()
+    loaded = compile_query("a | b", cache_dir=tmp_path)
+    assert loaded is not stored
+    assert loaded.dfa.is_equivalent_to(stored.dfa)
+    assert len(list(tmp_path.iterdir())) == 1
+    graph = cfpq_data.labeled_two_cycles_graph(2, 3, labels=("a", "b"))
+    assert ap_rpq(graph, loaded) == ap_rpq(graph, "a | b")
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_ap_rpq_batch(lazy):
+    graph = cfpq_data.labeled_two_cycles_graph(3, 2, labels=("a", "b"))
+    regexes = ["a* b", "b b", "a | b", "(a b)*", "a a a a"]
+    answers = ap_rpq_batch(graph, regexes, [0, 1, 4], [0, 3, 5], lazy)
+    assert answers == [ap_rpq(graph, r, [0, 1, 4], [0, 3, 5]) for r in regexes]
+    assert ap_rpq_batch(graph, []) == []
+    matrices = ap_rpq_batch(graph, regexes, output="matrix")
+    assert [m.nnz for m in matrices] == [len(ap_rpq(graph, r)) for r in regexes]
@@ -0,0 +1,86 @@
+import cfpq_data
+import numpy as np
+import pytest
+from pyformlang.cfg import CFG
+
+from project import cfpq
+from project.finite_state_machine_manager import ap_rpq, ms_rpq
+from project.graph_generators import *
+from project.graph_index import GraphIndex
+from project.graph_io import read_graph
+
+
+def get_edges(graph, chunk_size=CHUNK_SIZE):
+    return {
+        (v, u, graph.labels[label])
+        for sources, targets, labels in graph.edges(chunk_size)
+        for v, u, label in zip(sources.tolist(), targets.tolist(), labels.tolist())
+    }
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 100])
+def test_two_cycles_graph(chunk_size):
+    graph = two_cycles_graph(5, 3, labels=("fst", "snd"))
+    expected = cfpq_data.labeled_two_cycles_graph(5, 3, labels=("fst", "snd"))
+    assert graph.number_of_nodes == 9
+    assert get_edges(graph, chunk_size) == set(expected.edges(data="label"))
+
+
+def test_chain_and_grid_graphs():
+    assert get_edges(chain_graph(4, labels=("a", "b"))) == {
+        (0, 1, "a"),
+        (1, 2, "b"),
+        (2, 3, "a"),
+    }
+    assert get_edges(grid_graph(2, 3)) == {
+        (0, 1, "a"),
+        (1, 2, "a"),
+        (3, 4, "a"),
+        (4, 5, "a"),
+        (0, 3, "b"),
+        (1, 4, "b"),
+        (2, 5, "b"),
+    }
+
+
+@pytest.mark.parametrize(
+    "generate",
+    [
+        lambda seed: random_graph(50, 3 * RANDOM_BLOCK + 5, seed=seed),
+        lambda seed: scale_free_graph(50, 3 * RANDOM_BLOCK + 5, seed=seed),
+    ],
+)
+def test_random_graphs_are_reproducible(generate):
+    arrays = generate(1).to_arrays()
+    assert len(arrays[0]) == 3 * RANDOM_BLOCK + 5
+    assert all(array.max() < 50 for array in arrays[:2])
+    for chunk_size in (7, RANDOM_BLOCK, 2 * RANDOM_BLOCK + 1):
+        assert all(
+            np.array_equal(a, b)
+            for a, b in zip(arrays, generate(1).to_arrays(chunk_size))
+        )
+    assert not np.array_equal(arrays[0], generate(2).to_arrays()[0])
+
+
+def test_scale_free_graph_has_hubs():
+    index = scale_free_graph(1000, 20000, seed=0).to_index()
+    degrees = np.asarray(sum(index.matrices.values()).sum(axis=1)).ravel()
+    assert degrees[:5].min() > 10 * np.median(degrees)
+
+
+def test_engines_on_generated_graph(tmp_path):
+    graph = two_cycles_graph(3, 2)
+    index = graph.to_index()
+    expected = cfpq_data.labeled_two_cycles_graph(3, 2, labels=("a", "b"))
+    cfg = CFG.from_text("S -> a S b | a b")
+    assert set(ap_rpq(index, "a* b")) == set(ap_rpq(expected, "a* b"))
+    assert ms_rpq(index, "a b", [0, 1]) == ms_rpq(expected, "a b", [0, 1])
+    assert cfpq.matrix(index, cfg) == cfpq.matrix(expected, cfg)
+
+    graph.write_edges(tmp_path / "graph.txt")
+    assert cfpq.tensor(tmp_path / "graph.txt", cfg) == cfpq.tensor(expected, cfg)
+    graph.save(tmp_path / "index")
+    loaded = GraphIndex().load(tmp_path / "index")
+    for label, matrix in index.matrices.items():
+        assert (loaded.matrices[label] != matrix).nnz == 0
+        assert (read_graph(tmp_path / "graph.txt").matrices[label] != matrix).nnz == 0
@@ -0,0 +1,75 @@
+import cfpq_data
+import numpy as np
+from networkx import MultiDiGraph
+
+from project import cfpq
+from project.finite_state_machine_manager import ap_rpq, ms_rpq
+from project.graph_index import *
+
+
+def test_from_graph():
+    graph = cfpq_data.labeled_two_cycles_graph(2, 3, labels=("a", "b"))
+    graph.add_edge(1, 2, label="a")
+    index = GraphIndex().from_graph(graph)
+    assert index.number_of_nodes == 6
+    assert index.label_statistics == {"a": 3, "b": 4}
+    assert index.number_of_edges == 7
+    for v, u, label in graph.edges(data="label"):
+        assert index.matrices[label][index.vertices[v], index.vertices[u]]
+        assert index.csc(label)[index.vertices[v], index.vertices[u]]
+    assert get_graph_index(index) is index
+
+
+def test_named_vertices():
+    graph = MultiDiGraph()
+    graph.add_edge("x", "y", label="a")
+    graph.add_edge("y", "z", label="b")
+    index = GraphIndex().from_graph(graph)
+    assert ap_rpq(index, "a b") == [("x", "z")]
+    assert ms_rpq(index, "a b", ["x"]) == {("x", "z")}
+    assert ms_rpq(graph, "a*", ["x"], None, False) == {"y"}
+    assert cfpq.hellings(index, "S -> a b") == {("x", "z")}
+    assert cfpq.matrix(index, "S -> a b") == {("x", "z")}
+    assert cfpq.tensor(index, "S -> a b") == {("x", "z")}
+
+
+def test_from_edges():
+    graph = cfpq_data.labeled_two_cycles_graph(2, 3, labels=("a", "b"))
+    expected = GraphIndex().from_graph(graph)
+    edges = [
+        (expected.vertices[v], expected.vertices[u], label)
+        for v, u, label in graph.edges(data="label")
+    ]
+    sources, targets, labels = zip(*edges)
+    index = GraphIndex().from_edges(sources, targets, labels, expected.nodes)
+    assert index.label_statistics == expected.label_statistics
+    for label, matrix in expected.matrices.items():
+        assert (index.matrices[label] != matrix).nnz == 0
+    assert GraphIndex().from_edges([0, 3], [1, 2], ["a", "a"]).nodes == range(4)
+
+
+def test_save_and_load(tmp_path):
+    graph = cfpq_data.labeled_two_cycles_graph(2, 3, labels=("a", "b"))
+    index = GraphIndex().from_graph(graph).save(str(tmp_path))
+    loaded = GraphIndex().load(str(tmp_path))
+    assert list(loaded.nodes) == list(index.nodes)
+    assert loaded.label_statistics == index.label_statistics
+    for label, matrix in index.matrices.items():
+        assert (loaded.matrices[label] != matrix).nnz == 0
+
+
+def test_load_integer_nodes_mapped(tmp_path):
+    graph = cfpq_data.labeled_two_cycles_graph(3, 2, labels=("a", "b"))
+    index = GraphIndex().from_graph(graph).save(str(tmp_path))
+    loaded = GraphIndex().load(str(tmp_path))
+    assert isinstance(loaded.nodes, np.memmap)
+    assert list(loaded.nodes) == list(index.nodes)
+    assert set(ms_rpq(loaded, "a*b", {0})) == set(ms_rpq(index, "a*b", {0}))
+
+
+def test_load_named_nodes(tmp_path):
+    index = GraphIndex().from_edges([0, 1], [1, 2], ["a", "b"], ["x", "y", "z"])
+    index.save(str(tmp_path))
+    loaded = GraphIndex().load(str(tmp_path))
+    assert loaded.nodes == ["x", "y", "z"]
+    assert list(loaded.get_ids(["z", "x"])) == [0, 2]
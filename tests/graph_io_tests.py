@@ -0,0 +1,95 @@
+import cfpq_data
+import pytest
+from networkx import MultiDiGraph
+from pyformlang.cfg import CFG
+
+from project import cfpq
+from project.graph_io import *
+
+
+def get_edges(index):
+    return {
+        (index.nodes[v], index.nodes[u], label)
+        for label, matrix in index.matrices.items()
+        for v, u in zip(*matrix.nonzero())
+    }
+
+
+@pytest.mark.parametrize("chunk_size", [1, 100])
+def test_write_and_read_dot(tmp_path, chunk_size):
+    graph = cfpq_data.labeled_two_cycles_graph(5, 3, labels=("fst", "snd"))
+    graph.add_edge(2, 7, label="snd")
+    graph.add_edge(2, "x y", label="a b")
+    graph.add_node("isolated")
+    write_dot(graph, tmp_path / "graph.dot")
+    index = read_dot(tmp_path / "graph.dot", chunk_size)
+    assert list(index.nodes) == list(graph.nodes)
+    assert get_edges(index) == set(graph.edges(data="label"))
+
+    write_dot(index, tmp_path / "index.dot")
+    assert get_edges(read_graph(tmp_path / "index.dot")) == get_edges(index)
+
+
+def test_read_dot_statements(tmp_path):
+    (tmp_path / "graph.dot").write_text(
+        "strict digraph g {\n"
+        "  graph [rankdir=LR];\n"
+        "  node [shape=circle];\n"
+        "  // comment\n"
+        '  "1" -> b [key=0, label="x"];\n'
+        "  b -> 2;\n"
+        "  2 [label=y];\n"
+        "}\n"
+    )
+    index = read_dot(tmp_path / "graph.dot")
+    assert list(index.nodes) == [1, "b", 2]
+    assert get_edges(index) == {(1, "b", "x")}
+
+    (tmp_path / "path.dot").write_text("digraph {\n  a -> b -> c;\n}\n")
+    with pytest.raises(ValueError):
+        read_dot(tmp_path / "path.dot")
+
+
+def test_write_and_read_edges(tmp_path):
+    graph = cfpq_data.labeled_two_cycles_graph(2, 3, labels=("a", "b"))
+    write_edges(graph, tmp_path / "graph.txt")
+    index = read_graph(tmp_path / "graph.txt")
+    assert get_edges(index) == set(graph.edges(data="label"))
+
+
+def test_write_and_read_quoted_edges(tmp_path):
+    graph = MultiDiGraph()
+    graph.add_edge("New York", "Boston", label="is near")
+    graph.add_edge('say "hi"', "New York", label="a")
+    graph.add_edge("Boston", "line\nbreak", label="a")
+    write_edges(graph, tmp_path / "graph.txt")
+    assert get_edges(read_graph(tmp_path / "graph.txt")) == set(
+        graph.edges(data="label")
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 100])
+def test_read_edges_with_large_ids(tmp_path, chunk_size):
+    # the mask of the range of the ids would take 10 GB
+    (tmp_path / "graph.txt").write_text("0 1 a\n3 1 b\n1 10000000000 a\n")
+    index = read_graph(tmp_path / "graph.txt", chunk_size)
+    assert list(index.nodes) == [0, 1, 3, 10000000000]
+    assert get_edges(index) == {(0, 1, "a"), (3, 1, "b"), (1, 10000000000, "a")}
+
+    (tmp_path / "mixed.txt").write_text("1 10000000000 a\n3 1 b\nx 3 a\n")
+    index = read_graph(tmp_path / "mixed.txt", chunk_size)
+    assert set(index.nodes) == {"1", "10000000000", "3", "x"}
+    assert get_edges(index) == {
+        ("1", "10000000000", "a"),
+        ("3", "1", "b"),
+        ("x", "3", "a"),
+    }
+
+
+def test_cfpq_by_graph_file(tmp_path):
+    graph = cfpq_data.labeled_two_cycles_graph(2, 1, labels=("a", "b"))
+    write_dot(graph, tmp_path / "graph.dot")
+    cfg = CFG.from_text("S -> a S | P\nP -> b P | b")
+    assert cfpq.matrix(str(tmp_path / "graph.dot"), cfg) == cfpq.matrix(graph, cfg)
+    assert cfpq.tensor(tmp_path / "graph.dot", cfg) == cfpq.tensor(graph, cfg)
+    assert cfpq.hellings(tmp_path / "graph.dot", cfg) == cfpq.hellings(graph, cfg)
@@ -1,3 +1,5 @@
+import cfpq_data
+
 from project.graph_manager import *
 
 import pytest
@@ -21,3 +23,56 @@ def create_and_write_graph_test():
             "label=fst]; 0 -> 6  [key=0, label=snd]; 6 -> 7  [key=0, label=snd]; 7 -> 8  [key=0, label=snd]; 8 -> "
             "0  [key=0, label=snd]; } " == f.read().replace("\n", " ")
         )
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    graph = cfpq_data.labeled_two_cycles_graph(5, 3, labels=("fst", "snd"))
+    graph.add_edge(2, 7, label="snd")
+    cfpq_data.graph_to_mtx_dir(graph, tmp_path / "two_cycles" / "graph")
+    cfpq_data.graph_to_csv(graph, tmp_path / "two_cycles.csv")
+    paths = {"two_cycles": tmp_path / "two_cycles", "csv": tmp_path / "two_cycles.csv"}
+    monkeypatch.setattr(cfpq_data, "download", lambda name: paths[name])
+    monkeypatch.setattr(cfpq_data, "GRAPHS_DIR", tmp_path)
+    return graph
+
+
+@pytest.mark.parametrize("name", ["two_cycles", "csv"])
+@pytest.mark.parametrize("chunk_size", [2, 100])
+def test_get_graph_index_by_name(dataset, name, chunk_size):
+    assert get_graf_information_by_name(name, chunk_size) == (9, 11, ["fst", "snd"])
+    index = get_graph_index_by_name(name, chunk_size)
+    assert sorted(index.nodes) == list(range(9))
+    assert index.label_statistics == {"fst": 6, "snd": 5}
+    assert {
+        (index.nodes[v], index.nodes[u])
+        for v, u in zip(*index.matrices["snd"].nonzero())
+    } == {(v, u) for v, u, label in dataset.edges(data="label") if label == "snd"}
+    assert get_graph_by_name(name).number_of_edges() == 11
+
+
+@pytest.mark.parametrize("name", ["two_cycles", "csv"])
+def test_cached_graph_index(dataset, name):
+    index = get_graph_index_by_name(name)
+    path = get_graph_path(name)
+    assert (get_cache_path(path) / "checksum.json").exists()
+
+    cached = get_graph_index_by_name(name)
+    # the arrays of the cached index are read-only views of the mapped files
+    assert not cached.matrices["snd"].indices.flags.writeable
+    assert list(cached.nodes) == list(index.nodes)
+    for label, matrix in index.matrices.items():
+        assert (cached.matrices[label] != matrix).nnz == 0
+
+    # the same contents with another modification time keep the cache valid
+    for file in path.iterdir() if path.is_dir() else [path]:
+        os.utime(file, ns=(0, 0))
+    assert load_cached_index(path) is not None
+
+    dataset.add_edge(0, 3, label="fst")
+    if path.is_dir():
+        cfpq_data.graph_to_mtx_dir(dataset, path)
+    else:
+        cfpq_data.graph_to_csv(dataset, path)
+    assert load_cached_index(path) is None
+    assert get_graph_index_by_name(name).label_statistics["fst"] == 7
@@ -0,0 +1,66 @@
+import cfpq_data
+import pytest
+from networkx import MultiDiGraph
+
+from project import incremental_rpq
+from project.finite_state_machine_manager import ap_rpq
+from project.incremental_rpq import *
+
+
+def get_graph(edges):
+    graph = MultiDiGraph()
+    graph.add_nodes_from(range(4))
+    for v, u, label in edges:
+        graph.add_edge(v, u, label=label)
+    return graph
+
+
+def test_add_edges():
+    edges = [(0, 1, "a"), (1, 2, "a")]
+    query = MaintainedQuery(get_graph(edges), "a* b", [0, 1])
+    assert query.answer == []
+    query.add_edges([(2, 3, "b"), (3, 5, "b")])
+    assert sorted(query.answer) == [(0, 3), (1, 3)]
+    assert query.result.shape == (5, 5)
+
+
+@pytest.mark.parametrize("share", [0.0, 0.5, 1.0])
+def test_remove_edges(share, monkeypatch):
+    monkeypatch.setattr(incremental_rpq, "RECOMPUTE_SHARE", share)
+    graph = cfpq_data.labeled_two_cycles_graph(3, 2, labels=("a", "b"))
+    query = MaintainedQuery(graph, "a* b")
+    assert set(query.answer) == set(ap_rpq(graph, "a* b"))
+    removed = [(1, 2, "a"), (0, 4, "b"), (7, 8, "a")]
+    query.remove_edges(removed)
+    graph.remove_edge(1, 2)
+    graph.remove_edge(0, 4)
+    assert set(query.answer) == set(ap_rpq(graph, "a* b"))
+    query.add_edges([(1, 2, "a")])
+    graph.add_edge(1, 2, label="a")
+    assert set(query.answer) == set(ap_rpq(graph, "a* b"))
+
+
+def test_remove_parallel_edges(monkeypatch):
+    graph = get_graph([(0, 1, "a"), (0, 1, "a"), (1, 2, "b"), (0, 3, "a"), (0, 3, "b")])
+    query = MaintainedQuery(graph, "a* b")
+    # deletions do not rebuild the intersection of the whole graph
+    monkeypatch.setattr(query, "get_intersection", None)
+    query.remove_edges([(0, 1, "a")])
+    graph.remove_edge(0, 1)
+    assert (
+        sorted(query.answer)
+        == sorted(ap_rpq(graph, "a* b"))
+        == [(0, 2), (0, 3), (1, 2)]
+    )
+    query.remove_edges([(0, 1, "a"), (0, 1, "a")])
+    graph.remove_edge(0, 1)
+    assert sorted(query.answer) == sorted(ap_rpq(graph, "a* b")) == [(0, 3), (1, 2)]
+    query.add_edges([(0, 1, "a"), (0, 1, "a")])
+    query.remove_edges([(0, 1, "a")])
+    assert sorted(query.answer) == [(0, 2), (0, 3), (1, 2)]
+
+    # the transition from 0 to 3 is given by both labels
+    query = MaintainedQuery(graph, "a | b")
+    query.remove_edges([(0, 3, "a")])
+    graph.remove_edge(0, 3, key=0)
+    assert sorted(query.answer) == sorted(ap_rpq(graph, "a | b")) == [(0, 3), (1, 2)]
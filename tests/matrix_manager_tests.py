@@ -1,4 +1,5 @@
 import cfpq_data
+import pytest
 
 from project.finite_state_machine_manager import (
     create_dfsm_by_regular_expression,
@@ -53,3 +54,50 @@ def get_graph_intersection_by_matrix_test():
         ).getnnz()
         == 1
     )
+
+
+def test_get_boolean_matrices_by_edges():
+    matrices = get_boolean_matrices_by_edges(
+        [0, 1, 1, 2, 1], [1, 2, 2, 0, 0], ["a", "b", "b", "a", "a"], 4
+    )
+    assert set(matrices.keys()) == {"a", "b"}
+    assert matrices["a"].shape == (4, 4)
+    assert sorted(zip(*matrices["a"].nonzero())) == [(0, 1), (1, 0), (2, 0)]
+    assert sorted(zip(*matrices["b"].nonzero())) == [(1, 2)]
+    assert get_boolean_matrices_by_edges([], [], [], 3) == {}
+
+
+@pytest.mark.parametrize("strategy", ["semi_naive", "scc", "auto"])
+def test_transitive_closure_strategies(strategy):
+    matrix = get_boolean_matrix(
+        create_ndfsm_by_graph(
+            cfpq_data.labeled_two_cycles_graph(2, 3, labels=("a", "b"))
+        )
+    )
+    assert transitive_closure(matrix["a"], strategy).nnz == 9
+    assert transitive_closure(matrix["b"], strategy).nnz == 16
+    assert transitive_closure(matrix["a"] + matrix["b"], strategy).nnz == 36
+    chain = sparse.csr_matrix(
+        ([True] * 4, ([0, 1, 2, 3], [1, 2, 3, 4])), shape=(6, 6), dtype=bool
+    )
+    closure = transitive_closure(chain, strategy)
+    assert closure.nnz == 10
+    assert closure[0, 4] and not closure[4, 0] and not closure[0, 0]
+
+
+def test_get_reachable_graph_intersection():
+    graph = cfpq_data.labeled_two_cycles_graph(2, 3, labels=("a", "b"))
+    fst = get_boolean_matrix(create_ndfsm_by_graph(graph))
+    snd = create_dfsm_by_regular_expression("a*")
+    snd_states = get_states_index(snd)
+    matrix, states = get_reachable_graph_intersection(
+        fst,
+        get_boolean_matrix(snd),
+        [0],
+        [snd_states[state] for state in snd.start_states],
+        (len(graph.nodes), len(snd_states)),
+    )
+    # the vertex with id 0 and the whole a-cycle it lies on
+    assert matrix.shape == (3, 3)
+    assert matrix.nnz == 3
+    assert list(states) == sorted(states)
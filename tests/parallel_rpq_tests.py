@@ -0,0 +1,26 @@
+import cfpq_data
+import pytest
+
+from project.finite_state_machine_manager import ms_rpq
+from project.parallel_rpq import *
+
+
+def test_get_partitions():
+    assert get_partitions(list(range(7)), 3) == [[0, 1, 2], [3, 4], [5, 6]]
+    assert get_partitions([1, 2], 5) == [[1], [2]]
+    assert get_partitions([], 4) == []
+
+
+@pytest.mark.parametrize("for_each", [True, False])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parallel_ms_rpq(for_each, workers, tmp_path):
+    graph = cfpq_data.labeled_two_cycles_graph(4, 3, labels=("a", "b"))
+    assert parallel_ms_rpq(
+        graph,
+        "a* b",
+        [0, 2, 3, 5],
+        None,
+        for_each,
+        workers=workers,
+        directory=str(tmp_path),
+    ) == ms_rpq(graph, "a* b", [0, 2, 3, 5], None, for_each)
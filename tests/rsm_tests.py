@@ -112,3 +112,13 @@ def test_from_ecfg(ecfg, expected):
     expected_ecfg = ECFG().from_cfg(get_cfg_from_file(expected))
     expected = RSM().from_ecfg(expected_ecfg)
     assert rsm.productions == expected.productions
+
+
+def test_rsm_from_cfg():
+    cfg = get_cfg_from_text("S -> ( S ) S\nS -> epsilon\nA -> a")
+    rsm = RSM().from_cfg(cfg).minimize()
+    assert rsm.productions[Variable("S")].accepts(["(", "S", ")", "S"])
+    assert rsm.productions[Variable("S")].accepts([])
+    assert not rsm.productions[Variable("S")].accepts(["(", "S"])
+    assert rsm.productions[Variable("A")].accepts(["a"])
+    assert set(rsm.matrixes[Variable("S")].keys()) == {"(", ")", "S"}
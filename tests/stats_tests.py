@@ -0,0 +1,99 @@
+import json
+
+import cfpq_data
+import pytest
+from pyformlang.cfg import CFG
+from scipy import sparse
+
+from project import cfpq
+from project.finite_state_machine_manager import ap_rpq, ms_rpq
+from project.matrix_manager import transitive_closure
+from project.stats import *
+
+
+@pytest.mark.parametrize("semi_naive", [True, False])
+@pytest.mark.parametrize("backend", ["sparse", "dense", "bitset"])
+def test_matrix_stats(semi_naive, backend):
+    graph = cfpq_data.labeled_two_cycles_graph(3, 2, labels=("a", "b"))
+    cfg = CFG.from_text("S -> a S b | a b")
+    received = []
+    stats = EngineStats(callback=received.append)
+    answer = cfpq.matrix(graph, cfg, semi_naive, backend=backend, stats=stats)
+    assert answer == cfpq.matrix(graph, cfg, semi_naive, backend=backend)
+    assert received == stats.records
+
+    iterations = stats.get_records("matrix", "iteration")
+    assert [record["iteration"] for record in iterations] == list(
+        range(1, len(iterations) + 1)
+    )
+    # the last round of the fixpoint adds nothing
+    assert iterations[-1]["added"] == 0
+    assert sum(record["added"] for record in iterations) > 0
+    last = [
+        record
+        for record in stats.get_records("matrix", "matrix")
+        if record["iteration"] == len(iterations)
+    ]
+    assert {record["name"]: record["nnz"] for record in last}["S"] == len(answer)
+    assert all(0 <= record["density"] <= 1 for record in last)
+    products = stats.get_records("matrix", "product")
+    assert products and all(record["time"] >= 0 for record in products)
+    assert stats.summary()["matrix"]["products"] == len(products)
+
+
+@pytest.mark.parametrize("semi_naive", [True, False])
+def test_multiple_source_matrix_stats(semi_naive):
+    graph = cfpq_data.labeled_two_cycles_graph(3, 2, labels=("a", "b"))
+    cfg = CFG.from_text("S -> a S b | a b")
+    stats = EngineStats()
+    answer = cfpq.matrix(graph, cfg, semi_naive, start_vertex=[0], stats=stats)
+    assert answer == cfpq.matrix(graph, cfg, semi_naive, start_vertex=[0])
+    iterations = stats.get_records("matrix", "iteration")
+    assert [record["iteration"] for record in iterations] == list(
+        range(1, len(iterations) + 1)
+    )
+    assert iterations[-1]["added"] == iterations[-1]["added_sources"] == 0
+    # the sources grow from the start vertex
+    assert iterations[0]["sources"] < iterations[-1]["sources"]
+    assert sum(record["added"] for record in iterations) > 0
+    assert (
+        stats.summary()["matrix"]["products"]
+        == len(stats.get_records("matrix", "product"))
+        > 0
+    )
+
+
+@pytest.mark.parametrize("strategy", ["scc", "semi_naive"])
+def test_transitive_closure_stats(strategy):
+    matrix = sparse.diags([True] * 5, 1, shape=(6, 6), dtype=bool, format="csr")
+    stats = EngineStats()
+    closure = transitive_closure(matrix, strategy, stats=stats)
+    assert closure.nnz == 15
+    if strategy == "scc":
+        [record] = stats.records
+        assert record["event"] == "scc" and record["components"] == 6
+    else:
+        iterations = stats.get_records("transitive_closure", "iteration")
+        assert iterations[-1]["nnz"] == 15
+        assert sum(record["added"] for record in iterations) == 10
+
+
+def test_bfs_stats(tmp_path):
+    graph = cfpq_data.labeled_two_cycles_graph(3, 2, labels=("a", "b"))
+    stats = EngineStats()
+    assert ms_rpq(graph, "a* b", [1], stats=stats) == ms_rpq(graph, "a* b", [1])
+    iterations = stats.get_records("bfs", "iteration")
+    assert len(iterations) >= 2
+    assert {record["name"] for record in stats.get_records("bfs", "product")} == {
+        "a",
+        "b",
+        "move a",
+        "move b",
+    }
+
+    ap_rpq(graph, "a* b", stats=stats)
+    assert set(stats.summary()) == {"bfs", "transitive_closure"}
+    stats.to_json(tmp_path / "stats.json")
+    with open(tmp_path / "stats.json", "r") as file:
+        assert json.load(file) == stats.records
+    assert stats.clear().records == []